@@ -4,9 +4,11 @@
 import datetime
 import json
 import logging
+import threading
 import uuid
 import traceback
 import urllib.error
+from collections import defaultdict
 from itertools import groupby
 
 
@@ -18,6 +20,108 @@ from odoo.tools import DEFAULT_SERVER_DATE_FORMAT, float_compare
 
 _logger = logging.getLogger(__name__)
 
+# Local field of each remote -> local mapping model
+MIGRATED_LOCAL_FIELDS = {
+    "migrated.partner": "partner_id",
+    "migrated.journal": "account_journal_id",
+    "migrated.room.type": "pms_room_type_id",
+    "migrated.pricelist": "pms_pricelist_id",
+}
+
+# Remote fields read by the invoice migration (see _get_invoice_batch_data)
+INVOICE_FIELDS = [
+    "user_id",
+    "partner_id",
+    "refund_invoice_id",
+    "invoice_line_ids",
+    "id",
+    "number",
+    "origin",
+    "date_invoice",
+    "type",
+    "payment_ids",
+    "journal_id",
+    "folio_ids",
+]
+INVOICE_LINE_FIELDS = [
+    "name",
+    "reservation_ids",
+    "service_ids",
+    "invoice_line_tax_ids",
+    "price_unit",
+    "quantity",
+    "discount",
+]
+INVOICE_PARTNER_FIELDS = [
+    "name",
+    "vat",
+    "is_company",
+    "street",
+    "street2",
+    "city",
+    "zip",
+    "phone",
+    "mobile",
+    "email",
+    "country_id",
+]
+# Remote invoices read and prepared together
+INVOICE_BATCH = 200
+# Records updated by each query of _update_special_field_names
+SPECIAL_FIELDS_BATCH = 1000
+
+NODERPC_ERRORS = (
+    odoorpc.error.RPCError,
+    odoorpc.error.InternalError,
+    urllib.error.URLError,
+)
+
+# odoorpc clients of each worker thread, by migrated.hotel id
+_noderpc_pool = threading.local()
+# Reuse statistics of the pools of this worker, by migrated.hotel id
+_noderpc_stats = defaultdict(lambda: {"connects": 0, "reuses": 0, "relogins": 0})
+_noderpc_stats_lock = threading.Lock()
+
+
+def _count_noderpc(hotel_id, stat):
+    with _noderpc_stats_lock:
+        _noderpc_stats[hotel_id][stat] += 1
+
+
+def _is_session_expired(err):
+    data = isinstance(err.info, dict) and err.info.get("data") or {}
+    return "SessionExpired" in (data.get("name") or "")
+
+
+class _PooledODOO(odoorpc.ODOO):
+    """odoorpc client kept in the pool, logged in again when the V11 node
+    expires its session."""
+
+    def __init__(self, hotel_id, *args, **kwargs):
+        self._hotel_id = hotel_id
+        self._credentials = False
+        super().__init__(*args, **kwargs)
+
+    def login(self, db, login="admin", password="admin"):
+        super().login(db, login, password)
+        self._credentials = (db, login, password)
+
+    def json(self, url, params):
+        try:
+            return super().json(url, params)
+        except odoorpc.error.RPCError as err:
+            if not self._credentials or not _is_session_expired(err):
+                raise
+        _logger.info("Session expired in the V11 node, logging in again")
+        # Without credentials while logging in, so a new expiry is raised
+        credentials, self._credentials = self._credentials, False
+        try:
+            self.login(*credentials)
+        finally:
+            self._credentials = credentials
+        _count_noderpc(self._hotel_id, "relogins")
+        return super().json(url, params)
+
 
 class MigratedHotel(models.Model):
     _name = "migrated.hotel"
@@ -563,17 +667,7 @@ class MigratedHotel(models.Model):
             and self.migration_date_from
             and self.migration_date_to
         ):
-            try:
-                noderpc = odoorpc.ODOO(
-                    self.odoo_host, self.odoo_protocol, self.odoo_port
-                )
-                noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-            except (
-                odoorpc.error.RPCError,
-                odoorpc.error.InternalError,
-                urllib.error.URLError,
-            ) as err:
-                raise ValidationError(err)
+            noderpc = self._get_noderpc()
             self.count_total_pricelists = noderpc.env["product.pricelist"].search_count(
                 ["|", ("active", "=", True), ("active", "=", False)]
             )
@@ -750,6 +844,64 @@ class MigratedHotel(models.Model):
             noderpc.logout()
             return hotel_id
 
+    def _get_noderpc(self):
+        """Return an odoorpc client logged in the V11 node of the hotel.
+
+        The client is kept in a pool of the worker thread and reused by the
+        next jobs of the hotel, as long as its connection settings do not
+        change. An expired session is renewed on the fly (see _PooledODOO).
+        """
+        self.ensure_one()
+        pool = _noderpc_pool.__dict__.setdefault("clients", {})
+        settings = (
+            self.odoo_host,
+            self.odoo_protocol,
+            self.odoo_port,
+            self.odoo_db,
+            self.odoo_user,
+            self.odoo_password,
+        )
+        client = pool.get(self.id)
+        if client and client[0] == settings:
+            _count_noderpc(self.id, "reuses")
+            return client[1]
+        try:
+            noderpc = _PooledODOO(
+                self.id, self.odoo_host, self.odoo_protocol, self.odoo_port
+            )
+            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
+        except NODERPC_ERRORS as err:
+            raise ValidationError(err)
+        pool[self.id] = (settings, noderpc)
+        _count_noderpc(self.id, "connects")
+        return noderpc
+
+    def get_noderpc_stats(self):
+        """Return the V11 connection statistics of this worker by hotel:
+        new connections, reuses of a pooled one and logins after a session
+        expired."""
+        with _noderpc_stats_lock:
+            return {hotel.name: dict(_noderpc_stats[hotel.id]) for hotel in self}
+
+    def _get_id_map(self, model_name, remote_ids=None):
+        """Return the {remote_id: local_id} dict of the ``model_name``
+        mappings of the hotel (see MIGRATED_LOCAL_FIELDS), read in one query.
+
+        Load it once per batch and look the records up in it. ``remote_ids``
+        limits the warm up to the remote records of the batch.
+        """
+        self.ensure_one()
+        local_field = MIGRATED_LOCAL_FIELDS[model_name]
+        domain = [("migrated_hotel_id", "=", self.id), (local_field, "!=", False)]
+        if remote_ids is not None:
+            domain.append(("remote_id", "in", list(remote_ids)))
+        id_map = {}
+        for mapping in self.env[model_name].search_read(
+            domain, ["remote_id", local_field], order="id", load=None
+        ):
+            id_map.setdefault(mapping["remote_id"], mapping[local_field])
+        return id_map
+
     # PARTNERS ---------------------------------------------------------------------------------------------------------------------------
 
     def check_vat(self, vat, country_id):
@@ -884,15 +1036,7 @@ class MigratedHotel(models.Model):
     def action_migrate_partners(self):
         self.ensure_one()
 
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         PartnersMigrated = self.env["migrated.partner"]
         # prepare ine_codes
         _logger.info("Mapping local with remote 'ine code' ids...")
@@ -1011,7 +1155,6 @@ class MigratedHotel(models.Model):
         #     count += 1
         #     total_count += 1
         self.last_import_partners = import_datetime
-        noderpc.logout()
 
     @api.model
     def partner_batch(
@@ -1025,15 +1168,7 @@ class MigratedHotel(models.Model):
         """
         Prepare partner Batch
         """
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         partner_remote_fields = [
             "id",
             "document_number",
@@ -1082,7 +1217,6 @@ class MigratedHotel(models.Model):
 
         # self.last_import_partners = fields.Datetime.now()
         # self.count_migrated_partners = self.env["migrated.partner"].search_count([("migrated_hotel_id", "=", self.id)])
-        noderpc.logout()
 
     @api.model
     def migration_partner(
@@ -1460,15 +1594,7 @@ class MigratedHotel(models.Model):
 
     def action_migrate_folio(self):
         self.ensure_one()
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         try:
             for pricelist in self.env["migrated.pricelist"].search([("migrated_hotel_id", "=", self.id)]).mapped("pms_pricelist_id"):
@@ -1490,20 +1616,10 @@ class MigratedHotel(models.Model):
             urllib.error.URLError,
         ) as err:
             raise ValidationError(err)
-        else:
-            noderpc.logout()
 
     def action_migrate_folios(self, remote_folio_ids=False, final=False):
         self.ensure_one()
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         try:
             # 0- Review pms_property_ids config
@@ -1712,8 +1828,6 @@ class MigratedHotel(models.Model):
             urllib.error.URLError,
         ) as err:
             raise ValidationError(err)
-        else:
-            noderpc.logout()
 
     @api.model
     def folio_batch(
@@ -1722,15 +1836,7 @@ class MigratedHotel(models.Model):
         """
         Prepare Folio batch
         """
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         remote_hotel_folios = (
             noderpc.env["hotel.folio"].search_read(
@@ -1910,11 +2016,43 @@ class MigratedHotel(models.Model):
         # if folios_migrated:
         #     folios_migrated_remote_ids = folios_migrated.mapped("remote_id")
         # remote_hotel_folio_ids = list(set(remote_hotel_folios) - set(folios_migrated_remote_ids))
-        remote_folio_ids = (
+        remote_folio_ids = set(
             self.env["pms.folio"]
             .search([("pms_property_id", "=", self.pms_property_id.id)])
             .mapped("remote_id")
         )
+        # Index the children of the chunk by folio once, keeping their order
+        folio_of_reservation = {
+            res["id"]: res["folio_id"][0] for res in remote_hotel_reservations
+        }
+        folio_of_service = {
+            srv["id"]: srv["folio_id"] and srv["folio_id"][0]
+            for srv in remote_hotel_services
+        }
+        reservations_by_folio = defaultdict(list)
+        for res in remote_hotel_reservations:
+            reservations_by_folio[res["folio_id"][0]].append(res)
+        reservation_lines_by_folio = defaultdict(list)
+        for res in remote_hotel_reservation_lines:
+            reservation_lines_by_folio[
+                folio_of_reservation.get(res["reservation_id"][0])
+            ].append(res)
+        services_by_folio = defaultdict(list)
+        for res in remote_hotel_services:
+            services_by_folio[folio_of_service[res["id"]]].append(res)
+        service_lines_by_folio = defaultdict(list)
+        for res in remote_hotel_service_lines:
+            service_lines_by_folio[folio_of_service.get(res["service_id"][0])].append(
+                res
+            )
+        checkins_partners_by_folio = defaultdict(list)
+        for res in remote_checkin_partners:
+            checkins_partners_by_folio[
+                folio_of_reservation.get(res["reservation_id"][0])
+            ].append(res)
+        bindings_by_folio = defaultdict(list)
+        for b in remote_bindings:
+            bindings_by_folio[folio_of_reservation.get(b["odoo_id"][0])].append(b)
         count = 0
         errors_count = 0
         total = len(remote_hotel_folios)
@@ -1927,38 +2065,16 @@ class MigratedHotel(models.Model):
                 "Started migration of hotel.folio with remote ID: [%s]",
                 remote_hotel_folio,
             )
-            reservations_folio = [
-                res
-                for res in remote_hotel_reservations
-                if res["folio_id"][0] == remote_hotel_folio["id"]
-            ]
-            reservation_lines_folio = [
-                res
-                for res in remote_hotel_reservation_lines
-                if res["reservation_id"][0]
-                in [item["id"] for item in reservations_folio]
+            reservations_folio = reservations_by_folio[remote_hotel_folio["id"]]
+            reservation_lines_folio = reservation_lines_by_folio[
+                remote_hotel_folio["id"]
             ]
-            services_folio = [
-                res
-                for res in remote_hotel_services
-                if res["folio_id"][0] == remote_hotel_folio["id"]
-            ]
-            service_lines_folio = [
-                res
-                for res in remote_hotel_service_lines
-                if res["service_id"][0] in [item["id"] for item in services_folio]
-            ]
-            checkins_partners_folio = [
-                res
-                for res in remote_checkin_partners
-                if res["reservation_id"][0]
-                in [item["id"] for item in reservations_folio]
-            ]
-            folio_remote_bindings = [
-                b
-                for b in remote_bindings
-                if b["odoo_id"][0] in [item["id"] for item in reservations_folio]
+            services_folio = services_by_folio[remote_hotel_folio["id"]]
+            service_lines_folio = service_lines_by_folio[remote_hotel_folio["id"]]
+            checkins_partners_folio = checkins_partners_by_folio[
+                remote_hotel_folio["id"]
             ]
+            folio_remote_bindings = bindings_by_folio[remote_hotel_folio["id"]]
             if not direct_import:
                 self.with_company(
                     self.pms_property_id.company_id
@@ -2014,7 +2130,6 @@ class MigratedHotel(models.Model):
                 ("pms_property_id", "=", self.pms_property_id.id),
             ]
         )
-        noderpc.logout()
 
     @api.model
     def migration_folio(
@@ -2470,15 +2585,7 @@ class MigratedHotel(models.Model):
 
     def action_migrate_payments(self, final=False):
         self.ensure_one()
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         try:
             # Prepare Users
@@ -2609,6 +2716,15 @@ class MigratedHotel(models.Model):
                         folios_to_import_ids.append(payment["folio_id"][0])
             if folios_to_import_ids:
                 self.action_migrate_folios(folios_to_import_ids)
+            partner_map = self._get_id_map(
+                "migrated.partner",
+                {
+                    payment["partner_id"][0]
+                    for payment in remote_payment_vals
+                    if payment["partner_id"]
+                },
+            )
+            journal_map = self._get_id_map("migrated.journal")
             migrated_journals = []
             count = 0
             for remote_journal, journal_payments in groupby(
@@ -2616,25 +2732,16 @@ class MigratedHotel(models.Model):
             ):
                 if remote_journal[0] in migrated_journals:
                     continue
-                journal_id = (
-                    self.env["migrated.journal"]
-                    .search(
-                        [
-                            ("migrated_hotel_id", "=", self.id),
-                            ("remote_id", "=", remote_journal[0]),
-                        ]
-                    )
-                    .account_journal_id.id
-                )
+                journal_id = journal_map.get(remote_journal[0], False)
                 if not journal_id:
                     _logger.info("Journal No MAPPED: %s", remote_journal[1])
                     continue
                 self.env["account.journal"].browse(journal_id)
-                remote_journal_ids = (
-                    self.env["migrated.journal"]
-                    .search([("account_journal_id", "=", journal_id)])
-                    .mapped("remote_id")
-                )
+                remote_journal_ids = [
+                    remote_id
+                    for remote_id, local_id in journal_map.items()
+                    if local_id == journal_id
+                ]
                 migrated_journals.extend(remote_journal_ids)
                 journal_payments_tarjet = list(
                     filter(
@@ -2654,7 +2761,13 @@ class MigratedHotel(models.Model):
                     self.with_company(
                         self.pms_property_id.company_id
                     ).with_delay().create_bank_payment_migration(
-                        payment, remote_journal, res_users_map_ids, journal_id
+                        payment,
+                        remote_journal,
+                        res_users_map_ids,
+                        journal_id,
+                        **self._get_payment_local_ids(
+                            payment, partner_map, journal_map
+                        ),
                     )
                     count += 1
                     _logger.info(
@@ -2676,7 +2789,13 @@ class MigratedHotel(models.Model):
                     self.with_company(
                         self.pms_property_id.company_id
                     ).with_delay().create_bank_payment_migration(
-                        payment, remote_journal, res_users_map_ids, journal_id
+                        payment,
+                        remote_journal,
+                        res_users_map_ids,
+                        journal_id,
+                        **self._get_payment_local_ids(
+                            payment, partner_map, journal_map
+                        ),
                     )
                     count += 1
                     _logger.info(
@@ -2700,25 +2819,39 @@ class MigratedHotel(models.Model):
                 "ERROR account.payment with LOG #%s: (%s)", migrated_log.id, err
             )
 
+    def _get_payment_local_ids(self, payment, partner_map, journal_map):
+        """Return the local partner and destination journal of a remote
+        payment, looked up in the id maps of the batch."""
+        return {
+            "partner_id": payment["partner_id"]
+            and partner_map.get(payment["partner_id"][0], False),
+            "destination_journal_id": payment["destination_journal_id"]
+            and journal_map.get(payment["destination_journal_id"][0], False),
+        }
+
     def create_bank_payment_migration(
-        self, payment, remote_journal, res_users_map_ids, journal_id
+        self,
+        payment,
+        remote_journal,
+        res_users_map_ids,
+        journal_id,
+        partner_id=None,
+        destination_journal_id=None,
     ):
         remote_id = payment["create_uid"] and payment["create_uid"][0]
         res_create_uid = remote_id and res_users_map_ids.get(str(remote_id))
-        if payment["partner_id"]:
-            partner_id = (
-                self.env["migrated.partner"]
-                .search(
-                    [
-                        ("remote_id", "=", payment["partner_id"][0]),
-                        ("migrated_hotel_id", "=", self.id),
-                    ]
-                )
-                .partner_id.id
-                or False
+        if partner_id is None or destination_journal_id is None:
+            # Job queued without the local ids of the batch
+            local_ids = self._get_payment_local_ids(
+                payment,
+                self._get_id_map(
+                    "migrated.partner",
+                    payment["partner_id"] and [payment["partner_id"][0]] or [],
+                ),
+                self._get_id_map("migrated.journal"),
             )
-        else:
-            partner_id = False
+            partner_id = local_ids["partner_id"]
+            destination_journal_id = local_ids["destination_journal_id"]
         payment_ref = payment["communication"]
         if not payment_ref:
             if payment["folio_id"]:
@@ -2747,15 +2880,8 @@ class MigratedHotel(models.Model):
         destination_journal = False
         if payment_type == "transfer":
             is_internal_transfer = True
-            destination_journal = (
-                self.env["migrated.journal"]
-                .search(
-                    [
-                        ("migrated_hotel_id", "=", self.id),
-                        ("remote_id", "=", payment["destination_journal_id"][0]),
-                    ]
-                )
-                .account_journal_id
+            destination_journal = self.env["account.journal"].browse(
+                destination_journal_id
             )
             partner_id = destination_journal.company_id.partner_id.id
             if payment["destination_journal_id"][0] == remote_journal[0]:
@@ -2900,15 +3026,7 @@ class MigratedHotel(models.Model):
 
     def action_migrate_payment_returns(self):
         self.ensure_one()
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         try:
             _logger.info("Preparing 'payment.return' of interest...")
@@ -2956,6 +3074,18 @@ class MigratedHotel(models.Model):
                 "mail_notrack": True,
                 "mail_create_nolog": True,
             }
+            journal_map = self._get_id_map("migrated.journal")
+            partner_map = self._get_id_map(
+                "migrated.partner",
+                {
+                    line["partner_id"][0]
+                    for line in noderpc.env["payment.return.line"].search_read(
+                        [("return_id", "in", remote_payment_return_ids)],
+                        ["partner_id"],
+                    )
+                    if line["partner_id"]
+                },
+            )
             for payment_return_id in remote_payment_return_ids:
                 remote_payment_return = noderpc.env["payment.return"].browse(
                     payment_return_id
@@ -2965,15 +3095,8 @@ class MigratedHotel(models.Model):
                 # prepare related user create_uid
                 remote_id = remote_payment_return["create_uid"] and remote_payment_return["create_uid"][0]
                 res_create_uid = remote_id and res_users_map_ids.get(str(remote_id))
-                journal_id = (
-                    self.env["migrated.journal"]
-                    .search(
-                        [
-                            ("migrated_hotel_id", "=", self.id),
-                            ("remote_id", "=", remote_payment_return.journal_id.id),
-                        ]
-                    )
-                    .account_journal_id.id
+                journal_id = journal_map.get(
+                    remote_payment_return.journal_id.id, False
                 )
                 payment = self.env["account.payment"].search([
                     ("remote_id", "=", remote_payment_return_line.move_line_ids.payment_id.id),
@@ -2999,15 +3122,8 @@ class MigratedHotel(models.Model):
                     )
                 else:
                     folio_id = False
-                partner_id = (
-                    self.env["migrated.partner"]
-                    .search(
-                        [
-                            ("migrated_hotel_id", "=", self.id),
-                            ("remote_id", "=", remote_payment_return_line.partner_id.id),
-                        ]
-                    )
-                    .partner_id.id
+                partner_id = partner_map.get(
+                    remote_payment_return_line.partner_id.id, False
                 )
                 vals = {
                     "journal_id": journal_id,
@@ -3033,8 +3149,6 @@ class MigratedHotel(models.Model):
             urllib.error.URLError,
         ) as err:
             raise ValidationError(err)
-        else:
-            noderpc.logout()
 
     def migrate_payment_return(self, vals, context_no_mail):
         payment_return = (
@@ -3046,7 +3160,126 @@ class MigratedHotel(models.Model):
 
     # INVOICES ---------------------------------------------------------------------------------------------------------------------------
 
-    def _prepare_invoice_remote_data(self, account_invoice, res_users_map_ids, noderpc):
+    def _read_invoice_batch(self, noderpc, remote_invoice_ids, id_maps):
+        """Read the remote invoices ``remote_invoice_ids`` and their batch
+        data (see _get_invoice_batch_data).
+
+        When the chunk fails (e.g. a remote MissingError on one of its
+        invoices) they are read one by one, without batch data, and those
+        that still fail are logged in migrated.log and skipped.
+        """
+        try:
+            account_invoices = noderpc.env["account.invoice"].read(
+                remote_invoice_ids, INVOICE_FIELDS
+            )
+            return account_invoices, self._get_invoice_batch_data(
+                noderpc, account_invoices, id_maps
+            )
+        except (odoorpc.error.InternalError, urllib.error.URLError):
+            raise
+        except Exception as err:
+            _logger.warning(
+                "Remote account.invoice %s not read in batch (%s), one by one",
+                remote_invoice_ids,
+                err,
+            )
+        account_invoices = []
+        for remote_invoice_id in remote_invoice_ids:
+            try:
+                account_invoices.extend(
+                    noderpc.env["account.invoice"].read(
+                        [remote_invoice_id], INVOICE_FIELDS
+                    )
+                )
+            except (odoorpc.error.InternalError, urllib.error.URLError):
+                raise
+            except Exception as err:
+                migrated_log = self.env["migrated.log"].create(
+                    {
+                        "name": err,
+                        "date_time": fields.Datetime.now(),
+                        "migrated_hotel_id": self.id,
+                        "model": "invoice",
+                        "remote_id": remote_invoice_id,
+                    }
+                )
+                _logger.error(
+                    "Remote account.invoice with ID remote: [%s] with ERROR LOG #%s: (%s)",
+                    remote_invoice_id,
+                    migrated_log.id,
+                    err,
+                )
+        return account_invoices, None
+
+    def _get_invoice_batch_data(self, noderpc, account_invoices, id_maps):
+        """Read, with one call by model, the remote data that
+        _prepare_invoice_remote_data needs for ``account_invoices``: their
+        lines, the partners not migrated yet, the reservations (with their
+        folio), the services and the tax names."""
+        invoice_lines = noderpc.env["account.invoice.line"].read(
+            [
+                line_id
+                for account_invoice in account_invoices
+                for line_id in account_invoice["invoice_line_ids"]
+            ],
+            INVOICE_LINE_FIELDS,
+        )
+        remote_partner_ids = {
+            account_invoice["partner_id"][0]
+            for account_invoice in account_invoices
+            if account_invoice["partner_id"]
+            and account_invoice["partner_id"][0] not in id_maps["migrated.partner"]
+        }
+        remote_partners = noderpc.env["res.partner"].read(
+            list(remote_partner_ids), INVOICE_PARTNER_FIELDS
+        )
+        remote_ids = defaultdict(set)
+        for line in invoice_lines:
+            remote_ids["reservations"].update(line["reservation_ids"])
+            remote_ids["services"].update(line["service_ids"])
+            remote_ids["taxes"].update(line["invoice_line_tax_ids"])
+        remote_reservations = noderpc.env["hotel.reservation"].search_read(
+            [("id", "in", list(remote_ids["reservations"]))], ["folio_id"]
+        )
+        remote_service_ids = noderpc.env["hotel.service"].search(
+            [("id", "in", list(remote_ids["services"]))]
+        )
+        remote_taxes = noderpc.env["account.tax"].read(
+            list(remote_ids["taxes"]), ["name"]
+        )
+        return {
+            "invoice_lines": {line["id"]: line for line in invoice_lines},
+            "partners": {partner["id"]: partner for partner in remote_partners},
+            "reservations": {
+                reservation["id"]: reservation["folio_id"]
+                for reservation in remote_reservations
+            },
+            "service_ids": set(remote_service_ids),
+            "taxes": {tax["id"]: tax["name"] for tax in remote_taxes},
+        }
+
+    def _prepare_invoice_remote_data(
+        self,
+        account_invoice,
+        res_users_map_ids,
+        noderpc,
+        id_maps=None,
+        batch_data=None,
+    ):
+        if id_maps is None:
+            id_maps = {
+                "migrated.journal": self._get_id_map("migrated.journal"),
+                "migrated.partner": self._get_id_map(
+                    "migrated.partner",
+                    account_invoice["partner_id"]
+                    and [account_invoice["partner_id"][0]]
+                    or [],
+                ),
+            }
+        if batch_data is None:
+            batch_data = self._get_invoice_batch_data(
+                noderpc, [account_invoice], id_maps
+            )
         # search res_users ids
         remote_id = account_invoice["user_id"] and account_invoice["user_id"][0]
         res_user_id = (
@@ -3060,15 +3293,8 @@ class MigratedHotel(models.Model):
             [("user_ids", "in", self._context.get("uid", self._uid))]
         )
         # Journal
-        journal_id = (
-            self.env["migrated.journal"]
-            .search(
-                [
-                    ("remote_id", "=", account_invoice["journal_id"][0]),
-                    ("migrated_hotel_id", "=", self.id),
-                ]
-            )
-            .account_journal_id.id
+        journal_id = id_maps["migrated.journal"].get(
+            account_invoice["journal_id"][0], False
         )
         if not journal_id:
             raise ValidationError(
@@ -3078,24 +3304,36 @@ class MigratedHotel(models.Model):
         remote_id = account_invoice["partner_id"] and account_invoice["partner_id"][0]
         _logger.info("partner remote_id: %s", remote_id)
         res_partner = (
-            self.env["migrated.partner"]
-            .search(
-                [
-                    ("remote_id", "=", remote_id),
-                    ("migrated_hotel_id", "=", self.id),
-                ]
+            self.env["res.partner"].browse(
+                id_maps["migrated.partner"].get(remote_id, False)
             )
-            .partner_id
             or False
         )
         _logger.info(
             "partner res_partner: %s", res_partner.name if res_partner else "Not Found"
         )
         if not res_partner:
-            remote_partner = noderpc.env["res.partner"].browse(remote_id)
-            country_id = remote_partner.country_id.id if remote_partner.country_id else False
-            if country_id and remote_partner.vat:
-                res_partner = self._get_partner_vat(country_id=country_id, vat=remote_partner.vat)
+            remote_partner = batch_data["partners"].get(remote_id)
+            if not remote_partner:
+                err = "Remote partner with ID remote: [%s] not found" % remote_id
+                self.env["migrated.log"].create(
+                    {
+                        "name": err,
+                        "date_time": fields.Datetime.now(),
+                        "migrated_hotel_id": self.id,
+                        "model": "invoice",
+                        "remote_id": account_invoice["id"],
+                    }
+                )
+                _logger.error(err)
+                return False
+            country_id = (
+                remote_partner["country_id"] and remote_partner["country_id"][0]
+            )
+            if country_id and remote_partner["vat"]:
+                res_partner = self._get_partner_vat(
+                    country_id=country_id, vat=remote_partner["vat"]
+                )
             _logger.info(
                 "search vat res_partner: %s",
                 res_partner.name if res_partner else "Not Found",
@@ -3107,17 +3345,17 @@ class MigratedHotel(models.Model):
                         .with_context(no_vat_validation=True)
                         .create(
                             {
-                                "name": remote_partner.name,
-                                "vat": remote_partner.vat,
-                                "is_company": remote_partner.is_company,
-                                "street": remote_partner.street,
-                                "street2": remote_partner.street2,
-                                "city": remote_partner.city,
-                                "zip": remote_partner.zip,
-                                "phone": remote_partner.phone,
-                                "mobile": remote_partner.mobile,
-                                "email": remote_partner.email,
-                                "remote_id": remote_partner.id,
+                                "name": remote_partner["name"],
+                                "vat": remote_partner["vat"],
+                                "is_company": remote_partner["is_company"],
+                                "street": remote_partner["street"],
+                                "street2": remote_partner["street2"],
+                                "city": remote_partner["city"],
+                                "zip": remote_partner["zip"],
+                                "phone": remote_partner["phone"],
+                                "mobile": remote_partner["mobile"],
+                                "email": remote_partner["email"],
+                                "remote_id": remote_partner["id"],
                                 "country_id": country_id,
                             }
                         )
@@ -3125,7 +3363,7 @@ class MigratedHotel(models.Model):
                     self.env["migrated.partner"].create(
                         {
                             "partner_id": res_partner.id,
-                            "remote_id": remote_partner.id,
+                            "remote_id": remote_partner["id"],
                             "migrated_hotel_id": self.id,
                         }
                     )
@@ -3140,6 +3378,7 @@ class MigratedHotel(models.Model):
                             "date_time": fields.Datetime.now(),
                             "migrated_hotel_id": self.id,
                             "model": "invoice",
+                            "remote_id": account_invoice["id"],
                         }
                     )
                     _logger.error(
@@ -3150,10 +3389,11 @@ class MigratedHotel(models.Model):
                 self.env["migrated.partner"].create(
                     {
                         "partner_id": res_partner.id,
-                        "remote_id": remote_partner.id,
+                        "remote_id": remote_partner["id"],
                         "migrated_hotel_id": self.id,
                     }
                 )
+            id_maps["migrated.partner"][remote_partner["id"]] = res_partner.id
         # take into account merged partners are not active
         # if not res_partner_id:
         #     res_partner_id = self.env['res.partner'].search([
@@ -3177,23 +3417,21 @@ class MigratedHotel(models.Model):
                 or None
             )
 
-        remote_ids = (
-            account_invoice["invoice_line_ids"] and account_invoice["invoice_line_ids"]
-        )
-        invoice_lines = noderpc.env["account.invoice.line"].search_read(
-            [("id", "in", remote_ids)]
-        )
+        invoice_lines = [
+            batch_data["invoice_lines"][line_id]
+            for line_id in account_invoice["invoice_line_ids"]
+            if line_id in batch_data["invoice_lines"]
+        ]
         invoice_line_cmds = []
         # prepare invoice lines
         for invoice_line in invoice_lines:
             res_folio_sale_lines = self.env["folio.sale.line"]
             # search for reservation in sale_order_line
-            remote_reservation_ids = (
-                noderpc.env["hotel.reservation"].search(
-                    [("id", "in", invoice_line["reservation_ids"])]
-                )
-                or None
-            )
+            remote_reservation_ids = [
+                reservation_id
+                for reservation_id in invoice_line["reservation_ids"]
+                if reservation_id in batch_data["reservations"]
+            ] or None
             if remote_reservation_ids:
                 reservation_lines = (
                     self.env["pms.reservation"]
@@ -3208,11 +3446,11 @@ class MigratedHotel(models.Model):
                 )
                 if not reservation_lines:
                     # Try to force folio import
-                    remote_reservations = noderpc.env["hotel.reservation"].search_read(
-                        [("id", "in", remote_reservation_ids)], ["folio_id"]
-                    )
                     remote_folio_ids = list(
-                        {res["folio_id"][0] for res in remote_reservations}
+                        {
+                            batch_data["reservations"][reservation_id][0]
+                            for reservation_id in remote_reservation_ids
+                        }
                     )
                     self.action_migrate_folios(remote_folio_ids)
                     reservation_lines = (
@@ -3235,12 +3473,11 @@ class MigratedHotel(models.Model):
                 res_folio_sale_lines += reservation_lines.sale_line_ids
 
             # search for services in sale_order_line
-            remote_service_ids = (
-                noderpc.env["hotel.service"].search(
-                    [("id", "in", invoice_line["service_ids"])]
-                )
-                or None
-            )
+            remote_service_ids = [
+                service_id
+                for service_id in invoice_line["service_ids"]
+                if service_id in batch_data["service_ids"]
+            ] or None
             if remote_service_ids:
                 service_lines = (
                     self.env["pms.service"]
@@ -3272,16 +3509,19 @@ class MigratedHotel(models.Model):
                 product_id = res_folio_sale_lines.product_id.id or False
             # take invoice line taxes
             invoice_line_tax_ids = False
-            remote_tax = noderpc.env["account.tax"].browse(
-                invoice_line["invoice_line_tax_ids"]
-            )
-            if remote_tax:
+            if invoice_line["invoice_line_tax_ids"]:
                 invoice_line_tax_ids = (
                     self.env["account.tax"]
                     .search(
                         [
                             ("company_id", "=", self.company_id.id),
-                            ("name", "=", remote_tax.name),
+                            (
+                                "name",
+                                "=",
+                                batch_data["taxes"].get(
+                                    invoice_line["invoice_line_tax_ids"][0]
+                                ),
+                            ),
                         ]
                     )
                     .ids
@@ -3332,15 +3572,7 @@ class MigratedHotel(models.Model):
 
     def action_migrate_invoices(self, remote_invoice_ids=False, final=False):
         self.ensure_one()
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         try:
             # prepare res.users ids
@@ -3439,65 +3671,55 @@ class MigratedHotel(models.Model):
             )
             invoice_journals.check_chronology = False
             self.pms_property_id.company_id.check_min_partner_data_invoice = False
-            for remote_account_invoice_id in remote_account_invoice_ids:
-                try:
-                    i += 1
-                    _logger.info(str(i) + " of " + str(total) + " migration")
-                    _logger.info(
-                        "User #%s started migration of account.invoice with remote ID: [%s]",
-                        self._uid,
-                        remote_account_invoice_id,
-                    )
-                    rpc_account_invoice = noderpc.env[
-                        "account.invoice"
-                    ].search_read(
-                        [("id", "=", remote_account_invoice_id)],
-                        [
-                            "user_id",
-                            "partner_id",
-                            "refund_invoice_id",
-                            "invoice_line_ids",
-                            "id",
-                            "number",
-                            "origin",
-                            "date_invoice",
-                            "type",
-                            "payment_ids",
-                            "journal_id",
-                            "folio_ids",
-                        ],
-                    )[
-                        0
-                    ]
-                    if rpc_account_invoice["number"].strip() == "":
-                        continue
-                    vals = self._prepare_invoice_remote_data(
-                        rpc_account_invoice,
-                        res_users_map_ids,
-                        noderpc,
-                    )
-                    if not vals:
+            id_maps = {
+                "migrated.journal": self._get_id_map("migrated.journal"),
+                "migrated.partner": self._get_id_map("migrated.partner"),
+            }
+            for sublist in self.chunks(remote_account_invoice_ids, INVOICE_BATCH):
+                rpc_account_invoices, batch_data = self._read_invoice_batch(
+                    noderpc, sublist, id_maps
+                )
+                for rpc_account_invoice in rpc_account_invoices:
+                    remote_account_invoice_id = rpc_account_invoice["id"]
+                    try:
+                        i += 1
+                        _logger.info(str(i) + " of " + str(total) + " migration")
+                        _logger.info(
+                            "User #%s started migration of account.invoice with remote ID: [%s]",
+                            self._uid,
+                            remote_account_invoice_id,
+                        )
+                        if rpc_account_invoice["number"].strip() == "":
+                            continue
+                        vals = self._prepare_invoice_remote_data(
+                            rpc_account_invoice,
+                            res_users_map_ids,
+                            noderpc,
+                            id_maps,
+                            batch_data,
+                        )
+                        if not vals:
+                            continue
+                        self.with_delay().create_migration_invoice(
+                            vals, rpc_account_invoice["payment_ids"]
+                        )
+                    except (ValueError, ValidationError, Exception) as err:
+                        migrated_log = self.env["migrated.log"].create(
+                            {
+                                "name": err,
+                                "date_time": fields.Datetime.now(),
+                                "migrated_hotel_id": self.id,
+                                "model": "invoice",
+                                "remote_id": remote_account_invoice_id,
+                            }
+                        )
+                        _logger.error(
+                            "Remote account.invoice with ID remote: [%s] with ERROR LOG #%s: (%s)",
+                            remote_account_invoice_id,
+                            migrated_log.id,
+                            err,
+                        )
                         continue
-                    self.with_delay().create_migration_invoice(
-                        vals, rpc_account_invoice["payment_ids"]
-                    )
-                except (ValueError, ValidationError, Exception) as err:
-                    migrated_log = self.env["migrated.log"].create(
-                        {
-                            "name": err,
-                            "date_time": fields.Datetime.now(),
-                            "migrated_hotel_id": self.id,
-                            "model": "invoice",
-                            "remote_id": remote_account_invoice_id,
-                        }
-                    )
-                    _logger.error(
-                        "Remote account.invoice with ID remote: [%s] with ERROR LOG #%s: (%s)",
-                        remote_account_invoice_id,
-                        migrated_log.id,
-                        err,
-                    )
-                    continue
             self.pms_property_id.company_id.check_min_partner_data_invoice = min_data_invoice_company
             self.last_import_invoices = import_datetime
         except (
@@ -3506,8 +3728,6 @@ class MigratedHotel(models.Model):
             urllib.error.URLError,
         ) as err:
             raise ValidationError(err)
-        else:
-            noderpc.logout()
 
     def create_migration_invoice(self, vals, remote_payment_ids):
         context_no_mail = {
@@ -3545,76 +3765,82 @@ class MigratedHotel(models.Model):
     ):
         # prepare record ids
         _logger.info("Updating '%s' special field names..", local_model)
-        records = self.env[local_model].search(
-            [("remote_id", ">", 0), ("pms_property_id", "=", self.pms_property_id.id)]
+        records = self.env[local_model].search_read(
+            [("remote_id", ">", 0), ("pms_property_id", "=", self.pms_property_id.id)],
+            ["remote_id"],
+            order="id",
         )
-        rpc_records = noderpc.env[remote_model].search_read(
-            [("id", "in", records.mapped("remote_id"))],
-            ["id", "create_uid", "create_date"],
-        )
-        for record in records:
-            try:
-                rpc_record = [
-                    res for res in rpc_records if res["id"] == record.remote_id
-                ]
-                if rpc_record:
-                    rpc_record = rpc_record[0]
-                    create_uid = (
-                        rpc_record["create_uid"]
-                        and rpc_record["create_uid"][0]
-                        or False
-                    )
-                    create_uid = (
-                        create_uid and res_users_map_ids.get(str(create_uid)) or self._uid
-                    )
-                    create_date = (
-                        rpc_record["create_date"]
-                        and rpc_record["create_date"]
-                        or record.create_date
-                    )
-
-                    self.env.cr.execute(
-                        """UPDATE """
-                        + self.env[local_model]._table
-                        + """
-                                           SET create_uid = %s, create_date = %s WHERE id = %s""",
-                        (create_uid, create_date, record.id),
-                    )
-
-                    _logger.info(
-                        "User #%s has updated %s with ID [local, remote]: [%s, %s] - ",
-                        self._uid,
-                        local_model,
-                        record.id,
-                        record.remote_id,
-                    )
-                else:
+        table = self.env[local_model]._table
+        total = len(records)
+        count = 0
+        for sublist in self.chunks(records, SPECIAL_FIELDS_BATCH):
+            rpc_records = {
+                rpc_record["id"]: rpc_record
+                for rpc_record in noderpc.env[remote_model].search_read(
+                    [("id", "in", list({record["remote_id"] for record in sublist}))],
+                    ["id", "create_uid", "create_date"],
+                )
+            }
+            rows = []
+            for record in sublist:
+                rpc_record = rpc_records.get(record["remote_id"])
+                if not rpc_record:
                     _logger.error(
                         "record dont found (%s), local [%s]: remote (%s)",
                         local_model,
-                        record.id,
-                        record.remote_id,
+                        record["id"],
+                        record["remote_id"],
                     )
-
-            except (ValueError, ValidationError, Exception) as err:
+                    continue
+                create_uid = rpc_record["create_uid"] and rpc_record["create_uid"][0]
+                create_uid = (
+                    create_uid and res_users_map_ids.get(str(create_uid)) or self._uid
+                )
+                rows.append(
+                    (record["id"], create_uid, rpc_record["create_date"] or None)
+                )
+            count += len(sublist)
+            if not rows:
+                continue
+            # One UPDATE by chunk, keeping the local create_date when the
+            # remote one is not set
+            try:
+                with self.env.cr.savepoint():
+                    self.env.cr.execute(
+                        """
+                        UPDATE {table} AS t
+                        SET create_uid = v.create_uid,
+                            create_date = COALESCE(
+                                v.create_date::timestamp, t.create_date
+                            )
+                        FROM (VALUES {rows}) AS v(id, create_uid, create_date)
+                        WHERE t.id = v.id
+                        """.format(
+                            table=table, rows=", ".join(["(%s, %s, %s)"] * len(rows))
+                        ),
+                        [value for row in rows for value in row],
+                    )
+            except Exception as err:
                 _logger.error(
-                    "Failed updating hotel.folio with ID [local]: [%s] with ERROR LOG #%s: (%s)",
-                    record.id,
+                    "Failed updating %s with ID [local]: %s-%s: (%s)",
+                    local_model,
+                    sublist[0]["id"],
+                    sublist[-1]["id"],
                     err,
                 )
                 continue
+            _logger.info(
+                "User #%s has updated %s: %s of %s",
+                self._uid,
+                local_model,
+                count,
+                total,
+            )
+        self.env[local_model].invalidate_cache(["create_uid", "create_date"])
 
     def action_update_special_field_names(self):
         self.ensure_one()
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         try:
             # prepare res.users ids
@@ -3723,8 +3949,6 @@ class MigratedHotel(models.Model):
             urllib.error.URLError,
         ) as err:
             raise ValidationError(err)
-        else:
-            noderpc.logout()
 
     # CLEAN (review)-----
 
@@ -3740,15 +3964,7 @@ class MigratedHotel(models.Model):
 
     def action_migrate_debug(self):
         self.ensure_one()
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
 
         import wdb
 
@@ -3799,15 +4015,7 @@ class MigratedHotel(models.Model):
         hotel.action_update_special_field_names()
 
     def create_backend(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             if not self.backend_id:
                 remote_backend_id = noderpc.env["channel.backend"].search([])
@@ -3869,15 +4077,7 @@ class MigratedHotel(models.Model):
             _logger.error("backend import error:%s", err)
 
     def import_pricelists(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Importing Remote Pricelists...")
             import_datetime = fields.Datetime.now()
@@ -3923,15 +4123,7 @@ class MigratedHotel(models.Model):
             _logger.error("pricelist import error:%s", err)
 
     def import_room_type_classes(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Importing Remote Room Types Classes...")
             remote_ids = noderpc.env["hotel.room.type.class"].search(
@@ -3982,15 +4174,7 @@ class MigratedHotel(models.Model):
             raise UserError(
                 _("You must configure room type class previusly to room types import")
             )
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Importing Remote Room Types...")
             remote_ids = noderpc.env["hotel.room.type"].search(
@@ -4036,15 +4220,7 @@ class MigratedHotel(models.Model):
             _logger.error("roomtype import error:%s", err)
 
     def import_rooms(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Importing Remote Rooms...")
             for room_type in self.env["migrated.room.type"].search([("migrated_hotel_id", "=", self.id)]).mapped("pms_room_type_id"):
@@ -4213,15 +4389,7 @@ class MigratedHotel(models.Model):
             _logger.error("room import error:%s", err)
 
     def import_products(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Importing Remote Products...")
             import_datetime = fields.Datetime.now()
@@ -4366,15 +4534,7 @@ class MigratedHotel(models.Model):
             _logger.error("product import error:%s", err)
 
     def import_board_services(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Importing Remote Board Services...")
             remote_ids = noderpc.env["hotel.board.service"].search([])
@@ -4413,15 +4573,7 @@ class MigratedHotel(models.Model):
             _logger.error("boardservice class import error:%s", err)
 
     def import_board_service_room_types(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             for product in self.env["migrated.product"].search([("migrated_hotel_id", "=", self.id)]).mapped("product_id"):
                 if product.pms_property_ids and self.pms_property_id not in product.pms_property_ids:
@@ -4611,15 +4763,7 @@ class MigratedHotel(models.Model):
             _logger.error("Board services import error: %s", err)
 
     def import_journals(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Importing Remote Jorunals...")
             remote_ids = noderpc.env["account.journal"].search(
@@ -4980,15 +5124,7 @@ class MigratedHotel(models.Model):
         self.step = step
 
     def step1_create_bindings(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             _logger.info("Creating binding ids in room_types")
             room_types = self.env["pms.room.type"].search([
@@ -5058,15 +5194,7 @@ class MigratedHotel(models.Model):
             raise ValidationError(err)
 
     def step2_import_rule_and_prices(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             if self.migration_date_to - fields.Date.today() > datetime.timedelta(days=10):
                 raise ValidationError(
@@ -5080,11 +5208,20 @@ class MigratedHotel(models.Model):
                 ("pms_property_ids", "in", self.pms_property_id.id),
             ])
 
+            pricelist_map = self._get_id_map("migrated.pricelist")
+            room_type_map = self._get_id_map("migrated.room.type")
+            room_type_products = {
+                room_type.id: room_type.product_id.id
+                for room_type in self.env["pms.room.type"].browse(
+                    set(room_type_map.values())
+                )
+            }
             remote_pricelists = noderpc.env["product.pricelist"].browse(
-                self.env["migrated.pricelist"].search([
-                    ("pms_pricelist_id", "in", pricelists.ids),
-                    ("migrated_hotel_id", "=", self.id),
-                ]).mapped("remote_id")
+                [
+                    remote_id
+                    for remote_id, pricelist_id in pricelist_map.items()
+                    if pricelist_id in pricelists.ids
+                ]
             )
 
             items = noderpc.env["product.pricelist.item"].search_read(
@@ -5096,10 +5233,9 @@ class MigratedHotel(models.Model):
             )
 
             for item in items:
-                pricelist = self.env["migrated.pricelist"].search([
-                    ("remote_id", "=", item["pricelist_id"][0]),
-                    ("migrated_hotel_id", "=", self.id),
-                ]).pms_pricelist_id
+                pricelist = self.env["product.pricelist"].browse(
+                    pricelist_map.get(item["pricelist_id"][0])
+                )
                 remote_product_id = noderpc.env["product.product"].search_read(
                     [("product_tmpl_id", "=", item["product_tmpl_id"][0])],
                     ["id", ""],
@@ -5108,10 +5244,7 @@ class MigratedHotel(models.Model):
                     [("product_id", "=", remote_product_id)],
                     ["id"],
                 )[0]["id"]
-                product_id = self.env["migrated.room.type"].search([
-                    ("migrated_hotel_id", "=", self.id),
-                    ("remote_id", "=", remote_room_type_id),
-                ])[0].pms_room_type_id.product_id.id
+                product_id = room_type_products[room_type_map[remote_room_type_id]]
                 vals = {
                     "pricelist_id": pricelist.id,
                     "date_start_consumption": item["date_start"],
@@ -5159,9 +5292,7 @@ class MigratedHotel(models.Model):
                     for item in room_type_items:
                         date_vals.append({
                             "date": date,
-                            "room_type_id": self.env["migrated.room.type"].search(
-                                [("remote_id", "=", item["room_type_id"][0]),("migrated_hotel_id", "=", self.id)]
-                            ).pms_room_type_id.id,
+                            "room_type_id": room_type_map.get(item["room_type_id"][0], False),
                             "min_stay": item["min_stay"],
                             "max_stay": item["max_stay"],
                             "closed": item["closed"],
@@ -5179,9 +5310,7 @@ class MigratedHotel(models.Model):
                         else:
                             date_vals.append({
                                 "date": date,
-                                "room_type_id": self.env["migrated.room.type"].search(
-                                    [("remote_id", "=", item["room_type_id"][0]),("migrated_hotel_id", "=", self.id)]
-                                ).pms_room_type_id.id,
+                                "room_type_id": room_type_map.get(item["room_type_id"][0], False),
                                 "quota": item["quota"],
                                 "max_avail": item["max_avail"],
                             })
@@ -5253,15 +5382,7 @@ class MigratedHotel(models.Model):
         self.step = 7
 
     def step8_go_to_live(self):
-        try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
-        except (
-            odoorpc.error.RPCError,
-            odoorpc.error.InternalError,
-            urllib.error.URLError,
-        ) as err:
-            raise ValidationError(err)
+        noderpc = self._get_noderpc()
         try:
             # Disabled Wubook channel and Crons in V11
             _logger.info("Disabling Wubook channel and Crons in V11")
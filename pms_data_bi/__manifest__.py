@@ -4,22 +4,29 @@
 {
     "name": "PMS Data Bi",
     "summary": "Export hotel data for business intelligence",
-    "version": "14.0.3.1.0",
+    "version": "14.0.3.4.0",
     "license": "AGPL-3",
     "author": "Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>, "
     "Odoo Community Association (OCA)",
     "website": "https://github.com/OsoTranquilo/aldahotels.git",
-    "depends": ["pms", "pms_l10n_es"],
+    "depends": ["pms", "pms_l10n_es", "queue_job"],
     "category": "Generic Modules/Property Management System",
     "data": [
         "views/budget.xml",
         "views/inherit_pms_property.xml",
         "views/inherit_res_users.xml",
         "views/inherit_res_partners.xml",
+        "views/data_bi_export_run.xml",
+        "views/data_bi_country.xml",
+        "views/data_bi_section_stat.xml",
+        "data/queue_data.xml",
+        "data/ir_cron.xml",
+        "data/data_bi_country.xml",
         "security/data_bi.xml",
         "security/ir.model.access.csv",
     ],
     "demo": [],
+    "post_init_hook": "post_init_hook",
     "installable": True,
     "auto_install": False,
 }
@@ -0,0 +1,3 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from . import main
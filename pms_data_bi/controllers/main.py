@@ -0,0 +1,32 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+
+
+class DataBiExportController(http.Controller):
+    @http.route("/data_bi/export/<string:token>", type="http", auth="user")
+    def download(self, token):
+        """Stream the file of a finished asynchronous DataBI export."""
+        request = (
+            http.request.env["data_bi.export.request"]
+            .search([("token", "=", token), ("state", "=", "done")], limit=1)
+        )
+        if not request:
+            raise NotFound()
+        attachment = request.attachment_id.sudo()
+        if attachment.store_fname:
+            return http.send_file(
+                attachment._full_path(attachment.store_fname),
+                mimetype=attachment.mimetype,
+                filename=attachment.name,
+                as_attachment=True,
+            )
+        return http.request.make_response(
+            attachment.raw,
+            headers=[
+                ("Content-Type", attachment.mimetype),
+                ("Content-Disposition", http.content_disposition(attachment.name)),
+            ],
+        )
@@ -0,0 +1,9 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import SUPERUSER_ID, api
+
+
+def post_init_hook(cr, registry):
+    """Build the DataBI reservation nights of the sent propertys."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env["data_bi.reservation.night"].refresh()
@@ -0,0 +1,14 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+
+def migrate(cr, version):
+    """The countries were loaded from a csv without noupdate: keep the
+    changes made by hand in Revenue Management / DataBI countries."""
+    cr.execute(
+        """
+        UPDATE ir_model_data
+        SET noupdate = true
+        WHERE module = 'pms_data_bi' AND model = 'data_bi.country'
+        """
+    )
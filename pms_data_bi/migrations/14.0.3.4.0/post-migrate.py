@@ -0,0 +1,15 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """The cron is noupdate: refresh property by property from now on,
+    unless its code was changed by hand. Build the nights not built yet."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cron = env.ref(
+        "pms_data_bi.ir_cron_data_bi_night_refresh", raise_if_not_found=False
+    )
+    if cron and cron.code.strip() == "model.refresh()":
+        cron.code = "model.cron_refresh()"
+    env["data_bi.reservation.night"].refresh()
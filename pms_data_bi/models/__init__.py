@@ -1,5 +1,16 @@
 from . import inherit_pms_property
 from . import inherit_res_users
+from . import data_bi_dimension
+from . import data_bi_country
 from . import budget
 from . import data_bi
 from . import inherit_res_partner
+from . import data_bi_export_run
+from . import data_bi_tombstone
+from . import inherit_pms_reservation
+from . import data_bi_benchmark
+from . import data_bi_reservation_night
+from . import inherit_account_tax
+from . import data_bi_export_request
+from . import data_bi_section_stat
+from . import ir_attachment
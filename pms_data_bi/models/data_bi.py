@@ -18,15 +18,40 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 ##############################################################################
-import ftplib
+import base64
+import codecs
+import csv
+import functools
+import gzip
+import io
 import json
 import logging
 import tempfile
+import time
+import zipfile
 from datetime import date, datetime, timedelta
 
-from odoo import api, models
+from odoo import _, api, models, tools
+from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+
+from ..tools import DataBiTransport
 
 _logger = logging.getLogger(__name__)
+# Reservation lines read per batch when building Reservas
+DATA_BI_CHUNK = 2000
+# Bytes kept in memory before the export file is spooled to disk
+DATA_BI_SPOOL_SIZE = 16 * 1024 * 1024
+# Seconds a watermark is moved back for the commits around our snapshot
+DATA_BI_WATERMARK_MARGIN = 60
+# Bytes returned by each call of export_data_bi_download
+DATA_BI_DOWNLOAD_CHUNK = 4 * 1024 * 1024
+# Output formats and the extension of their files
+DATA_BI_FORMATS = {
+    "json": ".json",
+    "jsonl.gz": ".jsonl.gz",
+    "csv.zip": ".zip",
+}
 estado_array = [
     "draft",
     "confirm",
@@ -49,12 +74,11 @@ class DataBi(models.Model):
         limit_ago = self.calc_date_limit(fechafoto)
         hotels = self.calc_hoteles(hotelsdata)
         _logger.info("Exporting Reservations data Hotels IDs %s", hotels.ids)
+        secciones = self.export_sections(hotels, limit_ago, {6, 7, 9, 10})
         response = []
         for hotel in hotels:
-            response.append(self.export_one(hotel, limit_ago, 6))
-            response.append(self.export_one(hotel, limit_ago, 7))
-            response.append(self.export_one(hotel, limit_ago, 9))
-            response.append(self.export_one(hotel, limit_ago, 10))
+            for nombre, filas_hotel in secciones:
+                response.append([{nombre: filas_hotel.get(hotel.id, [])}])
         return json.dumps(response, ensure_ascii=False)
 
     @api.model
@@ -115,7 +139,14 @@ class DataBi(models.Model):
         return datadict
 
     @api.model
-    def export_data_bi(self, archivo=0, default_property=[0], fechafoto=False):
+    def export_data_bi(
+        self,
+        archivo=0,
+        default_property=[0],
+        fechafoto=False,
+        since=False,
+        formato="json",
+    ):
         u"""Prepare a Json Objet to export data for MyDataBI.
 
         Generate a dicctionary to by send in JSON
@@ -137,6 +168,12 @@ class DataBi(models.Model):
             archivo == 14 'Estado Reservas'
             archivo == 15 'Room names'
         fechafoto = start date to take data
+        since = 'YYYY-MM-DD HH:MM:SS' for a delta export: Reservas only has
+            the nights changed after that moment and 'Bajas' lists the
+            nights deleted or no longer reservations since then (deleted
+            nights are kept 30 days, see data_bi.tombstone.gc_tombstones)
+        formato = 'json' (default), 'jsonl.gz' or 'csv.zip' (see
+            data_bi_write), the compressed ones are returned in base64
         """
         limit_ago = self.calc_date_limit(fechafoto)
         hotels = self.calc_hoteles(default_property)
@@ -148,88 +185,333 @@ class DataBi(models.Model):
             fechafoto,
         )
 
-        if archivo == 0:
-            dic_export = self.export_all(hotels, limit_ago)
+        sections = self._data_bi_sections(
+            hotels,
+            limit_ago,
+            archivos=None if archivo == 0 else {archivo},
+            since=since,
+        )
+        if formato == "json":
+            stream = io.StringIO()
+            self.data_bi_write_json(stream, sections)
+            respuesta = stream.getvalue()
         else:
-            dic_export = self.export_one(hotels, limit_ago, archivo)
+            stream = io.BytesIO()
+            self.data_bi_write(stream, sections, formato)
+            respuesta = base64.b64encode(stream.getvalue()).decode("ascii")
 
         _logger.info("--- ### End Export Data_Bi Module to Json ### ---")
-        return json.dumps(dic_export, ensure_ascii=False)
+        return respuesta
 
     @api.model
-    def export_all(self, hotels, limit_ago):
-        line_res = self.env["pms.reservation.line"].search(
-            [("pms_property_id", "in", hotels.ids), ("date", ">=", limit_ago)],
-            order="id",
+    def export_data_bi_async(
+        self, archivo=0, default_property=[0], fechafoto=False, formato="json"
+    ):
+        """Queue export_data_bi and return its token at once.
+
+        Follow it with export_data_bi_status and get the file with
+        export_data_bi_download or from /data_bi/export/<token>. The same
+        export asked again the same day returns the token of the first one.
+        """
+        return (
+            self.env["data_bi.export.request"]
+            .request_export(
+                archivo, self.calc_hoteles(default_property), fechafoto, formato
+            )
+            .token
         )
-        dic_reservas = self.data_bi_reservas(
-            hotels,
-            line_res,
-            estado_array,
+
+    @api.model
+    def export_general_data_async(self, default_property=False):
+        """Queue export_general_data and return its token at once."""
+        hotels = self.env["pms.property"].browse(default_property or [])
+        return (
+            self.env["data_bi.export.request"]
+            .request_export("general", hotels.exists())
+            .token
         )
-        dic_export = [
-            {"Tarifa": self.data_bi_tarifa(hotels)},
-            {"Canal": self.data_bi_canal(hotels)},
-            {"Hotel": self.data_bi_hotel()},
-            {"Pais": self.data_bi_pais(hotels)},
-            {"Regimen": self.data_bi_regimen(hotels)},
-            {"Reservas": dic_reservas},
-            {"Capacidad": self.data_bi_capacidad(hotels)},
-            {"Tipo Habitación": self.data_bi_habitacione(hotels)},
-            {"Budget": self.data_bi_budget(hotels)},
-            {"Bloqueos": self.data_bi_bloqueos(hotels, line_res)},
-            {"Motivo Bloqueo": self.data_bi_moti_bloq(hotels)},
-            {"Segmentos": self.data_bi_segment(hotels)},
-            {"Clientes": self.data_bi_client(hotels)},
-            {"Estado Reservas": self.data_bi_estados(hotels)},
-            {"Nombre Habitaciones": self.data_bi_rooms(hotels)},
+
+    @api.model
+    def export_data_bi_status(self, token):
+        """Return the state ('pending', 'running', 'done' or 'failed'), size,
+        error and download url of the export of ``token``."""
+        return self._data_bi_export_request(token).get_status()
+
+    @api.model
+    def export_data_bi_download(self, token, offset=0, size=DATA_BI_DOWNLOAD_CHUNK):
+        """Return a piece of the file of a finished export, in base64.
+
+        Call it with the returned ``offset`` until ``eof`` is true.
+        """
+        request = self._data_bi_export_request(token)
+        if request.state != "done":
+            raise ValidationError(_("The DataBI export is not finished"))
+        data = request.read_chunk(offset, size)
+        return {
+            "data": base64.b64encode(data).decode("ascii"),
+            "offset": offset + len(data),
+            "size": request.size,
+            "eof": offset + len(data) >= request.size,
+        }
+
+    @api.model
+    def _data_bi_export_request(self, token):
+        request = self.env["data_bi.export.request"].search(
+            [("token", "=", token)], limit=1
+        )
+        if not request:
+            raise ValidationError(_("DataBI export %s not found") % token)
+        return request
+
+    @api.model
+    def export_all(self, hotels, limit_ago):
+        return [
+            {nombre: list(filas())}
+            for nombre, filas in self._data_bi_sections(hotels, limit_ago)
         ]
-        return dic_export
 
     @api.model
     def export_one(self, hotels, limit_ago, archivo):
-        if (archivo == 0) or (archivo == 10) or (archivo == 6):
+        return [
+            {nombre: list(filas())}
+            for nombre, filas in self._data_bi_sections(
+                hotels, limit_ago, archivos={archivo}
+            )
+        ]
+
+    @api.model
+    def export_rows(self, hotels, fechafoto=False, archivos=None):
+        """Return {section name: rows} of ``archivos`` for Python callers.
+
+        The rows are the dicts of export_data_bi, not encoded in JSON, and
+        only the requested archivos are computed. Reservas is a generator,
+        it can only be read once.
+        """
+        return {
+            nombre: filas()
+            for nombre, filas in self._data_bi_sections(
+                hotels, self.calc_date_limit(fechafoto), archivos=archivos
+            )
+        }
+
+    @api.model
+    def export_sections(self, hotels, limit_ago, archivos, since=False):
+        """Compute several archivos of several hotels in a single pass.
+
+        The line search, the batched reads and the capacity index are done
+        once for all the hotels. Return a list of ``(name, rows_by_hotel)``
+        in archivo order, ``rows_by_hotel`` being {hotel id: [rows]}. Only
+        for the archivos whose rows carry their hotel: 6, 7, 9, 10 and 15.
+        """
+        secciones = []
+        for nombre, filas in self._data_bi_sections(
+            hotels, limit_ago, archivos=archivos, since=since
+        ):
+            filas_hotel = {}
+            for fila in filas():
+                filas_hotel.setdefault(fila["ID_Hotel"], []).append(fila)
+            secciones.append((nombre, filas_hotel))
+        return secciones
+
+    @api.model
+    def _data_bi_sections(self, hotels, limit_ago, archivos=None, since=False):
+        """Return the ``(name, rows)`` pairs of the requested archivos.
+
+        ``rows`` is a callable so each section is only computed when it is
+        written, and Reservas is produced as a generator. ``archivos`` is a
+        set of archivo codes (see export_data_bi), None for all of them.
+        With ``since`` Reservas is a delta and a 'Bajas' section follows it.
+        The nights of ``hotels`` are refreshed first when Reservas is asked.
+        """
+        line_res = False
+        if hotels and (archivos is None or 6 in archivos):
+            self.env["data_bi.reservation.night"].refresh(hotels)
+        if since and (archivos is None or 6 in archivos):
             line_res = self.env["pms.reservation.line"].search(
-                [("pms_property_id", "in", hotels.ids), ("date", ">=", limit_ago)],
-                order="id",
+                self._data_bi_delta_domain(hotels, limit_ago, since)
+            )
+            # Nights recomputed by their refresh without a change in the
+            # line (taxes, partner INE codes, room types)
+            dominio = [
+                ("pms_property_id", "in", hotels.ids),
+                ("write_date", ">", since),
+            ]
+            if limit_ago:
+                dominio.append(("date", ">=", limit_ago))
+            line_res = (
+                line_res
+                | self.env["data_bi.reservation.night"].search(dominio).line_id
+            ).sorted("id")
+        secciones = [
+            (1, "Tarifa", lambda: self.data_bi_tarifa(hotels)),
+            (2, "Canal", lambda: self.data_bi_canal(hotels)),
+            (3, "Hotel", lambda: self.data_bi_hotel()),
+            (4, "Pais", lambda: self.data_bi_pais(hotels)),
+            (5, "Regimen", lambda: self.data_bi_regimen(hotels)),
+            (
+                6,
+                "Reservas",
+                lambda: self._data_bi_reservas_rows(
+                    hotels, estado_array, lines=line_res, limit_ago=limit_ago
+                ),
+            ),
+            (7, "Capacidad", lambda: self.data_bi_capacidad(hotels)),
+            (8, "Tipo Habitación", lambda: self.data_bi_habitacione(hotels)),
+            (9, "Budget", lambda: self.data_bi_budget(hotels)),
+            (
+                10,
+                "Bloqueos",
+                lambda: self.data_bi_bloqueos(hotels, limit_ago=limit_ago),
+            ),
+            (11, "Motivo Bloqueo", lambda: self.data_bi_moti_bloq(hotels)),
+            (12, "Segmentos", lambda: self.data_bi_segment(hotels)),
+            (13, "Clientes", lambda: self.data_bi_client(hotels)),
+            (14, "Estado Reservas", lambda: self.data_bi_estados(hotels)),
+            (15, "Nombre Habitaciones", lambda: self.data_bi_rooms(hotels)),
+        ]
+        if since:
+            secciones.insert(
+                6, (6, "Bajas", lambda: self.data_bi_bajas(hotels, line_res, since))
             )
-            dic_reservas = self.data_bi_reservas(
-                hotels,
-                line_res,
-                estado_array,
+        return [
+            (nombre, filas)
+            for archivo, nombre, filas in secciones
+            if archivos is None or archivo in archivos
+        ]
+
+    @api.model
+    def _data_bi_instrument(self, sections, medidas, stream):
+        """Wrap the rows of ``sections`` to measure them as they are written.
+
+        When a section is written, its seconds, SQL queries, rows and the
+        bytes it added to the binary ``stream`` (its tell() before and after,
+        compressed with jsonl.gz and csv.zip) are added to the ``medidas``
+        list (see data_bi.section.stat).
+        """
+        return [
+            (
+                nombre,
+                functools.partial(
+                    self._data_bi_measure, nombre, filas, medidas, stream
+                ),
             )
-        dic_export = []
-        if archivo == 1:
-            dic_export.append({"Tarifa": self.data_bi_tarifa(hotels)})
-        elif archivo == 2:
-            dic_export.append({"Canal": self.data_bi_canal(hotels)})
-        elif archivo == 3:
-            dic_export.append({"Hotel": self.data_bi_hotel()})
-        elif archivo == 4:
-            dic_export.append({"Pais": self.data_bi_pais(hotels)})
-        elif archivo == 5:
-            dic_export.append({"Regimen": self.data_bi_regimen(hotels)})
-        elif archivo == 6:
-            dic_export.append({"Reservas": dic_reservas})
-        elif archivo == 7:
-            dic_export.append({"Capacidad": self.data_bi_capacidad(hotels)})
-        elif archivo == 8:
-            dic_export.append({"Tipo Habitación": self.data_bi_habitacione(hotels)})
-        elif archivo == 9:
-            dic_export.append({"Budget": self.data_bi_budget(hotels)})
-        elif archivo == 10:
-            dic_export.append({"Bloqueos": self.data_bi_bloqueos(hotels, line_res)})
-        elif archivo == 11:
-            dic_export.append({"Motivo Bloqueo": self.data_bi_moti_bloq(hotels)})
-        elif archivo == 12:
-            dic_export.append({"Segmentos": self.data_bi_segment(hotels)})
-        elif archivo == 13:
-            dic_export.append({"Clientes": self.data_bi_client(hotels)})
-        elif archivo == 14:
-            dic_export.append({"Estado Reservas": self.data_bi_estados(hotels)})
-        elif archivo == 15:
-            dic_export.append({"Nombre Habitaciones": self.data_bi_rooms(hotels)})
-        return dic_export
+            for nombre, filas in sections
+        ]
+
+    @api.model
+    def _data_bi_measure(self, nombre, filas, medidas, stream):
+        cr = self.env.cr
+        inicio = time.perf_counter()
+        queries = cr.sql_log_count
+        posicion = stream.tell()
+        num_filas = 0
+        for fila in filas():
+            num_filas += 1
+            yield fila
+        medidas.append(
+            {
+                "section": nombre,
+                "seconds": time.perf_counter() - inicio,
+                "queries": cr.sql_log_count - queries,
+                "rows": num_filas,
+                "bytes": stream.tell() - posicion,
+            }
+        )
+
+    @api.model
+    def _data_bi_snapshot_time(self):
+        """Watermark for the changes read by the current transaction.
+
+        write_date is the start of the writing transaction, so a change
+        committed after our snapshot can be older than now(). The start of
+        the oldest transaction running in the database, minus
+        DATA_BI_WATERMARK_MARGIN, is not after any of those changes.
+        """
+        self.env.cr.execute(
+            """
+            SELECT (LEAST(now(), min(xact_start)) AT TIME ZONE 'UTC')
+                - interval '1 second' * %s
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            """,
+            [DATA_BI_WATERMARK_MARGIN],
+        )
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _data_bi_delta_domain(self, hotels, limit_ago, since):
+        """Reservation lines whose exported values may have changed.
+
+        Without ``limit_ago`` the lines of every date.
+        """
+        dominio = [("pms_property_id", "in", hotels.ids)]
+        if limit_ago:
+            dominio.append(("date", ">=", limit_ago))
+        return dominio + [
+            "|",
+            "|",
+            "|",
+            "|",
+            ("write_date", ">", since),
+            ("reservation_id.write_date", ">", since),
+            ("reservation_id.folio_id.write_date", ">", since),
+            ("reservation_id.service_ids.write_date", ">", since),
+            ("reservation_id.checkin_partner_ids.write_date", ">", since),
+        ]
+
+    @api.model
+    def data_bi_write(self, stream, sections, formato="json"):
+        """Write ``sections`` into the binary ``stream`` in ``formato``.
+
+        json: the MyDataBI document, see data_bi_write_json
+        jsonl.gz: gzip JSON Lines, one row per line with its 'Seccion'
+        csv.zip: zip file with one CSV per section
+        """
+        if formato == "jsonl.gz":
+            with gzip.GzipFile(fileobj=stream, mode="wb") as gz:
+                writer = codecs.getwriter("utf-8")(gz)
+                for nombre, filas in sections:
+                    for fila in filas():
+                        linea = {"Seccion": nombre}
+                        linea.update(fila)
+                        writer.write(json.dumps(linea, ensure_ascii=False) + "\n")
+        elif formato == "csv.zip":
+            with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zf:
+                for nombre, filas in sections:
+                    with zf.open(nombre + ".csv", "w") as member:
+                        writer = codecs.getwriter("utf-8")(member)
+                        csv_writer = False
+                        for fila in filas():
+                            if not csv_writer:
+                                csv_writer = csv.DictWriter(writer, list(fila))
+                                csv_writer.writeheader()
+                            csv_writer.writerow(
+                                {
+                                    key: "" if value is False else value
+                                    for key, value in fila.items()
+                                }
+                            )
+        else:
+            self.data_bi_write_json(codecs.getwriter("utf-8")(stream), sections)
+
+    @api.model
+    def data_bi_write_json(self, stream, sections):
+        """Encode ``sections`` into the text ``stream`` row by row.
+
+        Writes the same text as ``json.dumps([{name: rows}, ...],
+        ensure_ascii=False)`` without building the whole document first.
+        """
+        stream.write("[")
+        for index, (nombre, filas) in enumerate(sections):
+            if index:
+                stream.write(", ")
+            stream.write("{%s: [" % json.dumps(nombre, ensure_ascii=False))
+            for num, fila in enumerate(filas()):
+                if num:
+                    stream.write(", ")
+                stream.write(json.dumps(fila, ensure_ascii=False))
+            stream.write("]}")
+        stream.write("]")
 
     @api.model
     def data_bi_tarifa(self, hotels=False):
@@ -238,27 +520,12 @@ class DataBi(models.Model):
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([])
 
-        tarifas = (
-            self.env["product.pricelist"]
-            .sudo()
-            .search(
-                [
-                    "|",
-                    ("active", "=", False),
-                    ("active", "=", True),
-                ]
-            )
-            .filtered(
-                lambda r: not r.pms_property_ids
-                or any([p.id in hotels.ids for p in r.pms_property_ids])
-            )
-        )
-        for tarifa in tarifas:
+        for tarifa_id, nombre in self._data_bi_dimension("tarifa", tuple(hotels.ids)):
             dic_tarifa.append(
                 {
                     "ID_Hotel": hotels[0].id,
-                    "ID_Tarifa": tarifa["id"],
-                    "Descripción": tarifa["name"],
+                    "ID_Tarifa": tarifa_id,
+                    "Descripción": nombre,
                 }
             )
         return dic_tarifa
@@ -269,25 +536,15 @@ class DataBi(models.Model):
         dic_canal = []
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([])
-        channels = (
-            self.env["pms.sale.channel"]
-            .sudo()
-            .search([])
-            .filtered(
-                lambda r: not r.pms_property_ids
-                or any([p.id in hotels.ids for p in r.pms_property_ids])
-            )
-        )
-        # _logger.info("DataBi: Calculating %s Channels", str(len(channels)))
         dic_canal.append(
             {"ID_Hotel": hotels[0].id, "ID_Canal": 0, "Descripción": u"Ninguno"}
         )
-        for channel in channels:
+        for canal_id, nombre in self._data_bi_dimension("canal", tuple(hotels.ids)):
             dic_canal.append(
                 {
                     "ID_Hotel": hotels[0].id,
-                    "ID_Canal": channel["id"],
-                    "Descripción": channel["name"],
+                    "ID_Canal": canal_id,
+                    "Descripción": nombre,
                 }
             )
         return dic_canal
@@ -305,349 +562,35 @@ class DataBi(models.Model):
 
     @api.model
     def data_bi_pais(self, hotels=False):
+        # Diccionario con los nombre de los Paises usando los del INE [4]
         dic_pais = []
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([], limit=1)
-        dic_ine = [
-            {"ID_Pais": "NONE", "Descripción": "No Asignado"},
-            {"ID_Pais": "AFG", "Descripción": "Afganistán"},
-            {"ID_Pais": "ALB", "Descripción": "Albania"},
-            {"ID_Pais": "DEU", "Descripción": "Alemania"},
-            {"ID_Pais": "AND", "Descripción": "Andorra"},
-            {"ID_Pais": "AGO", "Descripción": "Angola"},
-            {"ID_Pais": "AIA", "Descripción": "Anguila"},
-            {"ID_Pais": "ATG", "Descripción": "Antigua y Barbuda"},
-            {"ID_Pais": "ANT", "Descripción": "Antillas Neerlandesas"},
-            {"ID_Pais": "ATA", "Descripción": "Antártida"},
-            {"ID_Pais": "SAU", "Descripción": "Arabia Saudita"},
-            {"ID_Pais": "DZA", "Descripción": "Argelia"},
-            {"ID_Pais": "ARG", "Descripción": "Argentina"},
-            {"ID_Pais": "ARM", "Descripción": "Armenia"},
-            {"ID_Pais": "ABW", "Descripción": "Aruba"},
-            {"ID_Pais": "AUS", "Descripción": "Australia"},
-            {"ID_Pais": "AUT", "Descripción": "Austria"},
-            {"ID_Pais": "AZE", "Descripción": "Azerbaiyán"},
-            {"ID_Pais": "BHS", "Descripción": "Bahamas"},
-            {"ID_Pais": "BHR", "Descripción": "Bahrein"},
-            {"ID_Pais": "BGD", "Descripción": "Bangladesh"},
-            {"ID_Pais": "BRB", "Descripción": "Barbados"},
-            {"ID_Pais": "BLZ", "Descripción": "Belice"},
-            {"ID_Pais": "BEN", "Descripción": "Benin"},
-            {"ID_Pais": "BMU", "Descripción": "Bermudas"},
-            {"ID_Pais": "BTN", "Descripción": "Bhután"},
-            {"ID_Pais": "BLR", "Descripción": "Bielorrusia"},
-            {"ID_Pais": "BOL", "Descripción": "Bolivia"},
-            {"ID_Pais": "BIH", "Descripción": "Bosnia-Herzegovina"},
-            {"ID_Pais": "BWA", "Descripción": "Botswana"},
-            {"ID_Pais": "BRA", "Descripción": "Brasil"},
-            {"ID_Pais": "BRN", "Descripción": "Brunéi"},
-            {"ID_Pais": "BGR", "Descripción": "Bulgaria"},
-            {"ID_Pais": "BFA", "Descripción": "Burkina Fasso"},
-            {"ID_Pais": "BDI", "Descripción": "Burundi"},
-            {"ID_Pais": "BEL", "Descripción": "Bélgica"},
-            {"ID_Pais": "CPV", "Descripción": "Cabo Verde"},
-            {"ID_Pais": "KHM", "Descripción": "Camboya"},
-            {"ID_Pais": "CMR", "Descripción": "Camerún"},
-            {"ID_Pais": "CAN", "Descripción": "Canadá"},
-            {"ID_Pais": "TCD", "Descripción": "Chad"},
-            {"ID_Pais": "CHL", "Descripción": "Chile"},
-            {"ID_Pais": "CHN", "Descripción": "China"},
-            {"ID_Pais": "CYP", "Descripción": "Chipre"},
-            {"ID_Pais": "COL", "Descripción": "Colombia"},
-            {"ID_Pais": "COM", "Descripción": "Comoras"},
-            {"ID_Pais": "COG", "Descripción": "Congo, República del"},
-            {"ID_Pais": "COD", "Descripción": "Congo, República Democrática del"},
-            {"ID_Pais": "PRK", "Descripción": "Corea, Rep. Popular Democrática"},
-            {"ID_Pais": "KOR", "Descripción": "Corea, República de"},
-            {"ID_Pais": "CIV", "Descripción": "Costa de Marfil"},
-            {"ID_Pais": "CRI", "Descripción": "Costa Rica"},
-            {"ID_Pais": "HRV", "Descripción": "Croacia"},
-            {"ID_Pais": "CUB", "Descripción": "Cuba"},
-            {"ID_Pais": "DNK", "Descripción": "Dinamarca"},
-            {"ID_Pais": "DMA", "Descripción": "Dominica"},
-            {"ID_Pais": "ECU", "Descripción": "Ecuador"},
-            {"ID_Pais": "EGY", "Descripción": "Egipto"},
-            {"ID_Pais": "SLV", "Descripción": "El Salvador"},
-            {"ID_Pais": "ARE", "Descripción": "Emiratos Arabes Unidos"},
-            {"ID_Pais": "ERI", "Descripción": "Eritrea"},
-            {"ID_Pais": "SVK", "Descripción": "Eslovaquia"},
-            {"ID_Pais": "SVN", "Descripción": "Eslovenia"},
-            {"ID_Pais": "USA", "Descripción": "Estados Unidos de América"},
-            {"ID_Pais": "EST", "Descripción": "Estonia"},
-            {"ID_Pais": "ETH", "Descripción": "Etiopía"},
-            {"ID_Pais": "PHL", "Descripción": "Filipinas"},
-            {"ID_Pais": "FIN", "Descripción": "Finlandia"},
-            {"ID_Pais": "FRA", "Descripción": "Francia"},
-            {"ID_Pais": "GAB", "Descripción": "Gabón"},
-            {"ID_Pais": "GMB", "Descripción": "Gambia"},
-            {"ID_Pais": "GEO", "Descripción": "Georgia"},
-            {"ID_Pais": "GHA", "Descripción": "Ghana"},
-            {"ID_Pais": "GIB", "Descripción": "Gibraltar"},
-            {"ID_Pais": "GRD", "Descripción": "Granada"},
-            {"ID_Pais": "GRC", "Descripción": "Grecia"},
-            {"ID_Pais": "GRL", "Descripción": "Groenlandia"},
-            {"ID_Pais": "GLP", "Descripción": "Guadalupe"},
-            {"ID_Pais": "GUM", "Descripción": "Guam"},
-            {"ID_Pais": "GTM", "Descripción": "Guatemala"},
-            {"ID_Pais": "GUF", "Descripción": "Guayana Francesa"},
-            {"ID_Pais": "GIN", "Descripción": "Guinea"},
-            {"ID_Pais": "GNQ", "Descripción": "Guinea Ecuatorial"},
-            {"ID_Pais": "GNB", "Descripción": "Guinea-Bissau"},
-            {"ID_Pais": "GUY", "Descripción": "Guyana"},
-            {"ID_Pais": "HTI", "Descripción": "Haití"},
-            {"ID_Pais": "HND", "Descripción": "Honduras"},
-            {"ID_Pais": "HKG", "Descripción": "Hong-Kong"},
-            {"ID_Pais": "HUN", "Descripción": "Hungría"},
-            {"ID_Pais": "IND", "Descripción": "India"},
-            {"ID_Pais": "IDN", "Descripción": "Indonesia"},
-            {"ID_Pais": "IRQ", "Descripción": "Irak"},
-            {"ID_Pais": "IRL", "Descripción": "Irlanda"},
-            {"ID_Pais": "IRN", "Descripción": "Irán"},
-            {"ID_Pais": "BVT", "Descripción": "Isla Bouvert"},
-            {"ID_Pais": "GGY", "Descripción": "Isla de Guernesey"},
-            {"ID_Pais": "JEY", "Descripción": "Isla de Jersey"},
-            {"ID_Pais": "IMN", "Descripción": "Isla de Man"},
-            {"ID_Pais": "CXR", "Descripción": "Isla de Navidad"},
-            {"ID_Pais": "ISL", "Descripción": "Islandia"},
-            {"ID_Pais": "CYM", "Descripción": "Islas Caimán"},
-            {"ID_Pais": "CCK", "Descripción": "Islas Cocos"},
-            {"ID_Pais": "COK", "Descripción": "Islas Cook"},
-            {"ID_Pais": "FLK", "Descripción": "Islas Falkland (Malvinas)"},
-            {"ID_Pais": "FRO", "Descripción": "Islas Feroé"},
-            {"ID_Pais": "FJI", "Descripción": "Islas Fidji"},
-            {"ID_Pais": "SGS", "Descripción": "Islas Georgias del Sur y Sandwich"},
-            {"ID_Pais": "HMD", "Descripción": "Islas Heard e Mcdonald"},
-            {"ID_Pais": "MNP", "Descripción": "Islas Marianas del Norte"},
-            {"ID_Pais": "MHL", "Descripción": "Islas Marshall"},
-            {"ID_Pais": "UMI", "Descripción": "Islas Menores de EEUU"},
-            {"ID_Pais": "NFK", "Descripción": "Islas Norfolk"},
-            {"ID_Pais": "PCN", "Descripción": "Islas Pitcairn"},
-            {"ID_Pais": "SLB", "Descripción": "Islas Salomón"},
-            {"ID_Pais": "TCA", "Descripción": "Islas Turcas y Caicos"},
-            {"ID_Pais": "VGB", "Descripción": "Islas Vírgenes Británicas"},
-            {"ID_Pais": "VIR", "Descripción": "Islas Vírgenes de los EEUU"},
-            {"ID_Pais": "WLF", "Descripción": "Islas Wallis y Futura"},
-            {"ID_Pais": "ALA", "Descripción": "Islas Åland"},
-            {"ID_Pais": "ISR", "Descripción": "Israel"},
-            {"ID_Pais": "ITA", "Descripción": "Italia"},
-            {"ID_Pais": "JAM", "Descripción": "Jamaica"},
-            {"ID_Pais": "JPN", "Descripción": "Japón"},
-            {"ID_Pais": "JOR", "Descripción": "Jordania"},
-            {"ID_Pais": "KAZ", "Descripción": "Kazajstán"},
-            {"ID_Pais": "KEN", "Descripción": "Kenia"},
-            {"ID_Pais": "KGZ", "Descripción": "Kirguistán"},
-            {"ID_Pais": "KIR", "Descripción": "Kiribati"},
-            {"ID_Pais": "KWT", "Descripción": "Kuwait"},
-            {"ID_Pais": "LAO", "Descripción": "Laos"},
-            {"ID_Pais": "LSO", "Descripción": "Lesotho"},
-            {"ID_Pais": "LVA", "Descripción": "Letonia"},
-            {"ID_Pais": "LBY", "Descripción": "Libia"},
-            {"ID_Pais": "LBR", "Descripción": "Libéria"},
-            {"ID_Pais": "LIE", "Descripción": "Liechtenstein"},
-            {"ID_Pais": "LTU", "Descripción": "Lituania"},
-            {"ID_Pais": "LUX", "Descripción": "Luxemburgo"},
-            {"ID_Pais": "LBN", "Descripción": "Líbano"},
-            {"ID_Pais": "MAC", "Descripción": "Macao"},
-            {"ID_Pais": "MKD", "Descripción": "Macedonia, ARY"},
-            {"ID_Pais": "MDG", "Descripción": "Madagascar"},
-            {"ID_Pais": "MYS", "Descripción": "Malasia"},
-            {"ID_Pais": "MWI", "Descripción": "Malawi"},
-            {"ID_Pais": "MDV", "Descripción": "Maldivas"},
-            {"ID_Pais": "MLT", "Descripción": "Malta"},
-            {"ID_Pais": "MLI", "Descripción": "Malí"},
-            {"ID_Pais": "MAR", "Descripción": "Marruecos"},
-            {"ID_Pais": "MTQ", "Descripción": "Martinica"},
-            {"ID_Pais": "MUS", "Descripción": "Mauricio"},
-            {"ID_Pais": "MRT", "Descripción": "Mauritania"},
-            {"ID_Pais": "MYT", "Descripción": "Mayotte"},
-            {"ID_Pais": "FSM", "Descripción": "Micronesia"},
-            {"ID_Pais": "MDA", "Descripción": "Moldavia"},
-            {"ID_Pais": "MNG", "Descripción": "Mongolia"},
-            {"ID_Pais": "MNE", "Descripción": "Montenegro"},
-            {"ID_Pais": "MSR", "Descripción": "Montserrat"},
-            {"ID_Pais": "MOZ", "Descripción": "Mozambique"},
-            {"ID_Pais": "MMR", "Descripción": "Myanmar"},
-            {"ID_Pais": "MEX", "Descripción": "México"},
-            {"ID_Pais": "MCO", "Descripción": "Mónaco"},
-            {"ID_Pais": "NAM", "Descripción": "Namibia"},
-            {"ID_Pais": "NRU", "Descripción": "Naurú"},
-            {"ID_Pais": "NPL", "Descripción": "Nepal"},
-            {"ID_Pais": "NIC", "Descripción": "Nicaragua"},
-            {"ID_Pais": "NGA", "Descripción": "Nigeria"},
-            {"ID_Pais": "NIU", "Descripción": "Niue"},
-            {"ID_Pais": "NOR", "Descripción": "Noruega"},
-            {"ID_Pais": "NCL", "Descripción": "Nueva Caledonia"},
-            {"ID_Pais": "NZL", "Descripción": "Nueva Zelanda"},
-            {"ID_Pais": "NER", "Descripción": "Níger"},
-            {"ID_Pais": "OMN", "Descripción": "Omán"},
-            {"ID_Pais": "PAK", "Descripción": "Pakistán"},
-            {"ID_Pais": "PLW", "Descripción": "Palau"},
-            {"ID_Pais": "PSE", "Descripción": "Palestina, Territorio ocupado"},
-            {"ID_Pais": "PAN", "Descripción": "Panamá"},
-            {"ID_Pais": "PNG", "Descripción": "Papua Nueva Guinea"},
-            {"ID_Pais": "PRY", "Descripción": "Paraguay"},
-            {"ID_Pais": "NLD", "Descripción": "Países Bajos"},
-            {"ID_Pais": "PER", "Descripción": "Perú"},
-            {"ID_Pais": "PYF", "Descripción": "Polinesia Francesa"},
-            {"ID_Pais": "POL", "Descripción": "Polonia"},
-            {"ID_Pais": "PRT", "Descripción": "Portugal"},
-            {"ID_Pais": "PRI", "Descripción": "Puerto Rico"},
-            {"ID_Pais": "QAT", "Descripción": "Qatar"},
-            {"ID_Pais": "GBR", "Descripción": "Reino Unido"},
-            {"ID_Pais": "CAF", "Descripción": "República Centroafricana"},
-            {"ID_Pais": "CZE", "Descripción": "República Checa"},
-            {"ID_Pais": "DOM", "Descripción": "República Dominicana"},
-            {"ID_Pais": "REU", "Descripción": "Reunión"},
-            {"ID_Pais": "ROU", "Descripción": "Rumania"},
-            {"ID_Pais": "RUS", "Descripción": "Rusia"},
-            {"ID_Pais": "RWA", "Descripción": "Rwanda"},
-            {"ID_Pais": "ESH", "Descripción": "Sahara Occidental"},
-            {"ID_Pais": "KNA", "Descripción": "Saint Kitts y Nevis"},
-            {"ID_Pais": "WSM", "Descripción": "Samoa"},
-            {"ID_Pais": "ASM", "Descripción": "Samoa Americana"},
-            {"ID_Pais": "BLM", "Descripción": "San Bartolomé"},
-            {"ID_Pais": "SMR", "Descripción": "San Marino"},
-            {"ID_Pais": "MAF", "Descripción": "San Martín"},
-            {"ID_Pais": "SPM", "Descripción": "San Pedro y Miquelón"},
-            {"ID_Pais": "VCT", "Descripción": "San Vicente y las Granadinas"},
-            {"ID_Pais": "SHN", "Descripción": "Santa Elena"},
-            {"ID_Pais": "LCA", "Descripción": "Santa Lucía"},
-            {"ID_Pais": "STP", "Descripción": "Santo Tomé y Príncipe"},
-            {"ID_Pais": "SEN", "Descripción": "Senegal"},
-            {"ID_Pais": "SRB", "Descripción": "Serbia"},
-            {"ID_Pais": "SYC", "Descripción": "Seychelles"},
-            {"ID_Pais": "SLE", "Descripción": "Sierra Leona"},
-            {"ID_Pais": "SGP", "Descripción": "Singapur"},
-            {"ID_Pais": "SYR", "Descripción": "Siria"},
-            {"ID_Pais": "SOM", "Descripción": "Somalia"},
-            {"ID_Pais": "LKA", "Descripción": "Sri Lanka"},
-            {"ID_Pais": "SWZ", "Descripción": "Suazilandia"},
-            {"ID_Pais": "ZAF", "Descripción": "Sudáfrica"},
-            {"ID_Pais": "SDN", "Descripción": "Sudán"},
-            {"ID_Pais": "SWE", "Descripción": "Suecia"},
-            {"ID_Pais": "CHE", "Descripción": "Suiza"},
-            {"ID_Pais": "SUR", "Descripción": "Suriname"},
-            {"ID_Pais": "SJM", "Descripción": "Svalbard e Islas de Jan Mayen"},
-            {"ID_Pais": "THA", "Descripción": "Tailandia"},
-            {"ID_Pais": "TWN", "Descripción": "Taiwán"},
-            {"ID_Pais": "TZA", "Descripción": "Tanzania"},
-            {"ID_Pais": "TJK", "Descripción": "Tayikistan"},
-            {"ID_Pais": "IOT", "Descripción": "Terr. Británico del Oc. Indico"},
-            {"ID_Pais": "ATF", "Descripción": "Tierras Australes Francesas"},
-            {"ID_Pais": "TLS", "Descripción": "Timor Oriental"},
-            {"ID_Pais": "TGO", "Descripción": "Togo"},
-            {"ID_Pais": "TKL", "Descripción": "Tokelau"},
-            {"ID_Pais": "TON", "Descripción": "Tonga"},
-            {"ID_Pais": "TTO", "Descripción": "Trinidad y Tobago"},
-            {"ID_Pais": "TKM", "Descripción": "Turkmenistán"},
-            {"ID_Pais": "TUR", "Descripción": "Turquía"},
-            {"ID_Pais": "TUV", "Descripción": "Tuvalu"},
-            {"ID_Pais": "TUN", "Descripción": "Túnez"},
-            {"ID_Pais": "UKR", "Descripción": "Ucrania"},
-            {"ID_Pais": "UGA", "Descripción": "Uganda"},
-            {"ID_Pais": "URY", "Descripción": "Uruguay"},
-            {"ID_Pais": "UZB", "Descripción": "Uzbekistán"},
-            {"ID_Pais": "VUT", "Descripción": "Vanuatu"},
-            {"ID_Pais": "VAT", "Descripción": "Vaticano, Santa Sede"},
-            {"ID_Pais": "VEN", "Descripción": "Venezuela"},
-            {"ID_Pais": "VNM", "Descripción": "Vietnam"},
-            {"ID_Pais": "YEM", "Descripción": "Yemen"},
-            {"ID_Pais": "DJI", "Descripción": "Yibuti"},
-            {"ID_Pais": "ZMB", "Descripción": "Zambia"},
-            {"ID_Pais": "ZWE", "Descripción": "Zimbabwe"},
-            {"ID_Pais": "KOS", "Descripción": "Kosovo"},
-            {"ID_Pais": "ES111", "Descripción": "A Coruña"},
-            {"ID_Pais": "ES112", "Descripción": "Lugo"},
-            {"ID_Pais": "ES113", "Descripción": "Ourense"},
-            {"ID_Pais": "ES114", "Descripción": "Pontevedra"},
-            {"ID_Pais": "ES120", "Descripción": "Asturias"},
-            {"ID_Pais": "ES130", "Descripción": "Cantabria"},
-            {"ID_Pais": "ES211", "Descripción": "Araba/Álava"},
-            {"ID_Pais": "ES212", "Descripción": "Gipuzkoa"},
-            {"ID_Pais": "ES213", "Descripción": "Bizkaia"},
-            {"ID_Pais": "ES220", "Descripción": "Navarra"},
-            {"ID_Pais": "ES230", "Descripción": "La Rioja"},
-            {"ID_Pais": "ES241", "Descripción": "Huesca"},
-            {"ID_Pais": "ES242", "Descripción": "Teruel"},
-            {"ID_Pais": "ES243", "Descripción": "Zaragoza"},
-            {"ID_Pais": "ES300", "Descripción": "Madrid"},
-            {"ID_Pais": "ES411", "Descripción": "Ávila"},
-            {"ID_Pais": "ES412", "Descripción": "Burgos"},
-            {"ID_Pais": "ES413", "Descripción": "León"},
-            {"ID_Pais": "ES414", "Descripción": "Palencia"},
-            {"ID_Pais": "ES415", "Descripción": "Salamanca"},
-            {"ID_Pais": "ES416", "Descripción": "Segovia"},
-            {"ID_Pais": "ES417", "Descripción": "Soria"},
-            {"ID_Pais": "ES418", "Descripción": "Valladolid"},
-            {"ID_Pais": "ES419", "Descripción": "Zamora"},
-            {"ID_Pais": "ES421", "Descripción": "Albacete"},
-            {"ID_Pais": "ES422", "Descripción": "Ciudad Real"},
-            {"ID_Pais": "ES423", "Descripción": "Cuenca"},
-            {"ID_Pais": "ES424", "Descripción": "Guadalajara"},
-            {"ID_Pais": "ES425", "Descripción": "Toledo"},
-            {"ID_Pais": "ES431", "Descripción": "Badajoz"},
-            {"ID_Pais": "ES432", "Descripción": "Cáceres"},
-            {"ID_Pais": "ES511", "Descripción": "Barcelona"},
-            {"ID_Pais": "ES512", "Descripción": "Girona"},
-            {"ID_Pais": "ES513", "Descripción": "Lleida"},
-            {"ID_Pais": "ES514", "Descripción": "Tarragona"},
-            {"ID_Pais": "ES521", "Descripción": "Alicante / Alacant"},
-            {"ID_Pais": "ES522", "Descripción": "Castellón / Castelló"},
-            {"ID_Pais": "ES523", "Descripción": "Valencia / Valéncia"},
-            {"ID_Pais": "ES530", "Descripción": "Illes Balears"},
-            {"ID_Pais": "ES531", "Descripción": "Eivissa y Formentera"},
-            {"ID_Pais": "ES532", "Descripción": "Mallorca"},
-            {"ID_Pais": "ES533", "Descripción": "Menorca"},
-            {"ID_Pais": "ES611", "Descripción": "Almería"},
-            {"ID_Pais": "ES612", "Descripción": "Cádiz"},
-            {"ID_Pais": "ES613", "Descripción": "Córdoba"},
-            {"ID_Pais": "ES614", "Descripción": "Granada"},
-            {"ID_Pais": "ES615", "Descripción": "Huelva"},
-            {"ID_Pais": "ES616", "Descripción": "Jaén"},
-            {"ID_Pais": "ES617", "Descripción": "Málaga"},
-            {"ID_Pais": "ES618", "Descripción": "Sevilla"},
-            {"ID_Pais": "ES620", "Descripción": "Murcia"},
-            {"ID_Pais": "ES630", "Descripción": "Ceuta"},
-            {"ID_Pais": "ES640", "Descripción": "Melilla"},
-            {"ID_Pais": "ES701", "Descripción": "Las Palmas"},
-            {"ID_Pais": "ES702", "Descripción": "Santa Cruz de Tenerife"},
-            {"ID_Pais": "ES703", "Descripción": "El Hierro"},
-            {"ID_Pais": "ES704", "Descripción": "Fuerteventura"},
-            {"ID_Pais": "ES705", "Descripción": "Gran Canaria"},
-            {"ID_Pais": "ES706", "Descripción": "La Gomera"},
-            {"ID_Pais": "ES707", "Descripción": "La Palma"},
-            {"ID_Pais": "ES708", "Descripción": "Lanzarote"},
-            {"ID_Pais": "ES709", "Descripción": "Tenerife"},
-        ]
-        # Diccionario con los nombre de los Paises usando los del INE [4]
-        # _logger.info("DataBi: Calculating %s countries", str(len(dic_ine)))
+        paises = self._data_bi_dimension("pais", ())
         for prop in hotels:
-            for pais in dic_ine:
+            for codigo, nombre in paises:
                 dic_pais.append(
                     {
                         "ID_Hotel": prop.id,
-                        "ID_Pais": pais["ID_Pais"],
-                        "Descripción": pais["Descripción"],
+                        "ID_Pais": codigo,
+                        "Descripción": nombre,
                     }
                 )
         return dic_pais
 
+    @api.model
+    @tools.ormcache()
+    def data_bi_country_index(self):
+        """Return the INE country catalogue (data_bi.country) as
+        {code: description}."""
+        return dict(self._data_bi_dimension("pais", ()))
+
     @api.model
     def data_bi_regimen(self, hotels=False):
         # Diccionario con los Board Services [5]
         dic_regimen = []
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([])
-        board_services = (
-            self.env["pms.board.service"]
-            .sudo()
-            .search([])
-            .filtered(
-                lambda r: not r.pms_property_ids
-                or any([p.id in hotels.ids for p in r.pms_property_ids])
-            )
-        )
-        # _logger.info("DataBi: Calculating %s board services",
         dic_regimen.append(
             {
                 "ID_Hotel": hotels[0].id,
@@ -655,12 +598,14 @@ class DataBi(models.Model):
                 "Descripción": u"Sin régimen",
             }
         )
-        for board_service in board_services:
+        for regimen_id, nombre in self._data_bi_dimension(
+            "regimen", tuple(hotels.ids)
+        ):
             dic_regimen.append(
                 {
                     "ID_Hotel": hotels[0].id,
-                    "ID_Regimen": board_service["id"],
-                    "Descripción": board_service["name"],
+                    "ID_Regimen": regimen_id,
+                    "Descripción": nombre,
                 }
             )
         return dic_regimen
@@ -670,46 +615,56 @@ class DataBi(models.Model):
         # Diccionario con las capacidades  [7]
         rooms_type = self.env["pms.room.type"].search([])
         # _logger.info("DataBi: Calculating %s room capacity", str(len(rooms)))
+        capacidades = self.data_bi_capacity_index(hotels)
+        hasta_fecha = (date.today() + timedelta(days=365 * 3)).strftime("%Y-%m-%d")
         dic_capacidad = []
         for prop in hotels:
             for room_type in rooms_type:
-                room_count = self.data_bi_get_capacidad(prop.id, room_type.id)
+                room_count = capacidades.get((prop.id, room_type.id), 0)
                 if room_count > 0:
                     dic_capacidad.append(
                         {
                             "ID_Hotel": prop.id,
-                            "Hasta_Fecha": (
-                                date.today() + timedelta(days=365 * 3)
-                            ).strftime("%Y-%m-%d"),
+                            "Hasta_Fecha": hasta_fecha,
                             "ID_Tipo_Habitacion": room_type.id,
                             "Nro_Habitaciones": room_count,
                         }
                     )
         return dic_capacidad
 
+    @api.model
+    def data_bi_capacity_index(self, hotels=False):
+        """Number of rooms by (property id, room type id) in one query.
+
+        hotels = pms.property recordset, all the propertys if not set
+        """
+        dominio = [("pms_property_id", "in", hotels.ids)] if hotels else []
+        return {
+            (grupo["pms_property_id"][0], grupo["room_type_id"][0]): grupo["__count"]
+            for grupo in self.env["pms.room"].read_group(
+                dominio,
+                ["pms_property_id", "room_type_id"],
+                ["pms_property_id", "room_type_id"],
+                lazy=False,
+            )
+            if grupo["pms_property_id"] and grupo["room_type_id"]
+        }
+
     @api.model
     def data_bi_habitacione(self, hotels=False):
         # Diccionario con Rooms types [8]
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([])
-        rooms = (
-            self.env["pms.room.type"]
-            .sudo()
-            .search([])
-            .filtered(
-                lambda r: not r.pms_property_ids
-                or any([p.id in hotels.ids for p in r.pms_property_ids])
-            )
-        )
-        # _logger.info("DataBi: Calculating %s room types", str(len(rooms)))
         dic_tipo_habitacion = []
-        for room in rooms:
+        for room_type_id, nombre, estancias in self._data_bi_dimension(
+            "habitacione", tuple(hotels.ids)
+        ):
             dic_tipo_habitacion.append(
                 {
                     "ID_Hotel": hotels[0].id,
-                    "ID_Tipo_Habitacion": room["id"],
-                    "Descripción": room["name"],
-                    "Estancias": room[0].get_room_type_capacity(hotels[0].id),
+                    "ID_Tipo_Habitacion": room_type_id,
+                    "Descripción": nombre,
+                    "Estancias": estancias,
                 }
             )
         return dic_tipo_habitacion
@@ -761,17 +716,6 @@ class DataBi(models.Model):
         dic_moti_bloq = []
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([])
-        lineas = (
-            self.env["room.closure.reason"]
-            .sudo()
-            .search([])
-            .filtered(
-                lambda r: not r.pms_property_ids
-                or any([p.id in hotels.ids for p in r.pms_property_ids])
-            )
-        )
-        # _logger.info("DataBi: Calculating %s blocking reasons",
-        #   str(len(lineas)))
         dic_moti_bloq.append(
             {
                 "ID_Hotel": hotels[0].id,
@@ -786,12 +730,14 @@ class DataBi(models.Model):
                 "Descripción": u"Staff",
             }
         )
-        for linea in lineas:
+        for motivo_id, nombre in self._data_bi_dimension(
+            "moti_bloq", tuple(hotels.ids)
+        ):
             dic_moti_bloq.append(
                 {
                     "ID_Hotel": hotels[0].id,
-                    "ID_Motivo_Bloqueo": "B" + str(linea.id),
-                    "Descripción": linea.name,
+                    "ID_Motivo_Bloqueo": "B" + str(motivo_id),
+                    "Descripción": nombre,
                 }
             )
         return dic_moti_bloq
@@ -824,27 +770,17 @@ class DataBi(models.Model):
         dic_clientes = []
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([])
-        lineas = (
-            self.env["res.partner"]
-            .sudo()
-            .search([("is_agency", "=", True)])
-            .filtered(
-                lambda r: not r.pms_property_ids
-                or any([p.id in hotels.ids for p in r.pms_property_ids])
-            )
-        )
-        # _logger.info("DataBi: Calculating %s Operators", str(len(lineas)))
         dic_clientes.append(
             {"ID_Hotel": hotels[0].id, "ID_Cliente": 0, "Descripción": u"Ninguno"}
         )
-        for linea in lineas:
+        for cliente_id, nombre in self._data_bi_dimension(
+            "client", tuple(hotels.ids)
+        ):
             dic_clientes.append(
                 {
                     "ID_Hotel": hotels[0].id,
-                    "ID_Cliente": linea.id,
-                    "Descripción": linea.data_bi_ref
-                    if linea.data_bi_ref
-                    else linea.name,
+                    "ID_Cliente": cliente_id,
+                    "Descripción": nombre,
                 }
             )
         return dic_clientes
@@ -881,203 +817,504 @@ class DataBi(models.Model):
         dic_rooms = []
         if not hotels:
             hotels = self.env["pms.property"].sudo().search([])
-        rooms = (
-            self.env["pms.room"]
-            .sudo()
-            .search([])
-            .filtered(
-                lambda r: not r.pms_property_id
-                or any([p.id in hotels.ids for p in r.pms_property_id])
-            )
-        )
-        # _logger.info("DataBi: Calculating %s name rooms.", str(len(rooms)))
-        for room in rooms:
+        for hotel_id, room_id, nombre in self._data_bi_dimension(
+            "rooms", tuple(hotels.ids)
+        ):
             dic_rooms.append(
                 {
-                    "ID_Hotel": room.pms_property_id.id,
-                    "ID_Room": room.id,
-                    "Descripción": room.name,
+                    "ID_Hotel": hotel_id,
+                    "ID_Room": room_id,
+                    "Descripción": nombre,
                 }
             )
         return dic_rooms
 
     @api.model
-    def data_bi_bloqueos(self, hotels, lines):
+    @tools.ormcache("self.env.lang", "seccion", "hotel_ids")
+    def _data_bi_dimension(self, seccion, hotel_ids):
+        """Return the rows of a master data section as tuples.
+
+        Cached by property set until one of the records behind the
+        sections changes (see data_bi.dimension.mixin).
+        """
+        dominio = [
+            "|",
+            ("pms_property_ids", "=", False),
+            ("pms_property_ids", "in", list(hotel_ids)),
+        ]
+        if seccion == "tarifa":
+            tarifas = (
+                self.env["product.pricelist"]
+                .sudo()
+                .search(["|", ("active", "=", False), ("active", "=", True)] + dominio)
+            )
+            return tuple((tarifa.id, tarifa.name) for tarifa in tarifas)
+        if seccion == "canal":
+            channels = self.env["pms.sale.channel"].sudo().search(dominio)
+            return tuple((channel.id, channel.name) for channel in channels)
+        if seccion == "regimen":
+            boards = self.env["pms.board.service"].sudo().search(dominio)
+            return tuple((board.id, board.name) for board in boards)
+        if seccion == "habitacione":
+            rooms = self.env["pms.room.type"].sudo().search(dominio)
+            return tuple(
+                (room.id, room.name, room.get_room_type_capacity(hotel_ids[0]))
+                for room in rooms
+            )
+        if seccion == "moti_bloq":
+            lineas = self.env["room.closure.reason"].sudo().search(dominio)
+            return tuple((linea.id, linea.name) for linea in lineas)
+        if seccion == "client":
+            lineas = (
+                self.env["res.partner"]
+                .sudo()
+                .search([("is_agency", "=", True)] + dominio)
+            )
+            return tuple(
+                (linea.id, linea.data_bi_ref if linea.data_bi_ref else linea.name)
+                for linea in lineas
+            )
+        if seccion == "pais":
+            paises = self.env["data_bi.country"].sudo().search([])
+            return tuple((pais.code, pais.name) for pais in paises)
+        if seccion == "rooms":
+            rooms = (
+                self.env["pms.room"]
+                .sudo()
+                .search(
+                    [
+                        "|",
+                        ("pms_property_id", "=", False),
+                        ("pms_property_id", "in", list(hotel_ids)),
+                    ]
+                )
+            )
+            return tuple(
+                (room.pms_property_id.id, room.id, room.name) for room in rooms
+            )
+        return ()
+
+    @api.model
+    def data_bi_bajas(self, hotels, lines, since):
+        # Diccionario con las noches borradas o que ya no son reserva [6]
+        dic_bajas = []
+        bajas = [
+            (linea.reservation_id.id, linea.pms_property_id.id, linea.date)
+            for linea in lines.filtered(
+                lambda n: n.reservation_id.reservation_type != "normal"
+            )
+        ]
+        for tombstone in self.env["data_bi.tombstone"].search_read(
+            [("pms_property_id", "in", hotels.ids), ("create_date", ">", since)],
+            ["reservation_id", "pms_property_id", "date"],
+            load=None,
+        ):
+            bajas.append(
+                (
+                    tombstone["reservation_id"],
+                    tombstone["pms_property_id"],
+                    tombstone["date"],
+                )
+            )
+        for reserva, hotel, fecha in sorted(set(bajas)):
+            dic_bajas.append(
+                {
+                    "ID_Reserva": reserva,
+                    "ID_Hotel": hotel,
+                    "Entrada": fecha.strftime("%Y-%m-%d"),
+                }
+            )
+        return dic_bajas
+
+    @api.model
+    def data_bi_bloqueos(self, hotels, lines=False, limit_ago=False):
         # Diccionario con Bloqueos [10]
+        # Lineas de bloqueos de los hoteles: las de ``lines`` o, sin ellas,
+        # las que tengan fecha desde ``limit_ago``.
         dic_bloqueos = []
-        lines = lines.filtered(
-            lambda n: (
-                (n.reservation_id.reservation_type != "normal")
-                and (n.reservation_id.state != "cancel")
-            )
+        dominio = [
+            ("pms_property_id", "in", hotels.ids),
+            ("reservation_id.reservation_type", "!=", "normal"),
+            ("reservation_id.state", "!=", "cancel"),
+        ]
+        if lines is not False:
+            dominio.append(("id", "in", lines.ids))
+        else:
+            dominio.append(("date", ">=", limit_ago))
+        lineas = self.env["pms.reservation.line"].search_read(
+            dominio,
+            ["pms_property_id", "date", "reservation_id"],
+            order="id",
+            load=None,
+        )
+        reservas = self._data_bi_read(
+            "pms.reservation",
+            [linea["reservation_id"] for linea in lineas],
+            ["reservation_type", "closure_reason_id", "room_type_id"],
         )
         # _logger.info("DataBi: Calculating %s Bloqued", str(len(lines)))
-        for line in lines:
-
-            if line.pms_property_id.id in hotels.ids:
-                motivo = "0"
-                if line.reservation_id.reservation_type == "out":
-                    motivo = (
-                        "B0"
-                        if not line.reservation_id.closure_reason_id.id
-                        else ("B" + str(line.reservation_id.closure_reason_id.id))
-                    )
-
-                elif line.reservation_id.reservation_type == "staff":
-                    motivo = "ST"
-                dic_bloqueos.append(
-                    {
-                        "ID_Hotel": line.pms_property_id.id,
-                        "Fecha_desde": line.date.strftime("%Y-%m-%d"),
-                        "Fecha_hasta": (line.date + timedelta(days=1)).strftime(
-                            "%Y-%m-%d"
-                        ),
-                        "ID_Tipo_Habitacion": line.reservation_id.room_type_id.id,
-                        "ID_Motivo_Bloqueo": motivo,
-                        "Nro_Habitaciones": 1,
-                    }
+        for linea in lineas:
+            reserva = reservas[linea["reservation_id"]]
+            motivo = "0"
+            if reserva["reservation_type"] == "out":
+                motivo = (
+                    "B0"
+                    if not reserva["closure_reason_id"]
+                    else ("B" + str(reserva["closure_reason_id"]))
                 )
+
+            elif reserva["reservation_type"] == "staff":
+                motivo = "ST"
+            dic_bloqueos.append(
+                {
+                    "ID_Hotel": linea["pms_property_id"],
+                    "Fecha_desde": linea["date"].strftime("%Y-%m-%d"),
+                    "Fecha_hasta": (linea["date"] + timedelta(days=1)).strftime(
+                        "%Y-%m-%d"
+                    ),
+                    "ID_Tipo_Habitacion": reserva["room_type_id"],
+                    "ID_Motivo_Bloqueo": motivo,
+                    "Nro_Habitaciones": 1,
+                }
+            )
         return dic_bloqueos
 
     @api.model
     def data_bi_reservas(self, hotels, lines, estado_array):
         # Diccionario con Reservas  [6]
-        dic_reservas = []
+        self.env["data_bi.reservation.night"].refresh(hotels)
+        return list(self._data_bi_reservas_rows(hotels, estado_array, lines=lines))
 
+    @api.model
+    def _data_bi_reservas_rows(
+        self, hotels, estado_array, lines=False, limit_ago=False
+    ):
+        """Yield the Reservas rows of ``lines`` or, without them, of the
+        nights from ``limit_ago``, hotel by hotel.
+
+        The rows are read from data_bi.reservation.night (refreshed by
+        _data_bi_sections), in chunks; the cache is dropped after each chunk
+        so memory stays flat. The ID_Pais not in the country table are
+        logged as a warning.
+        """
+        noches = self.env["data_bi.reservation.night"]
+        paises = self.data_bi_country_index()
+        fecha_extraccion = date.today().strftime("%Y-%m-%d")
         for prop in hotels:
-            lineas = lines.filtered(
-                lambda n: (
-                    (n.pms_property_id.id == prop.id)
-                    and (n.reservation_id.reservation_type == "normal")
+            dominio = [("pms_property_id", "=", prop.id)]
+            if lines is not False:
+                dominio.append(("line_id", "in", lines.ids))
+            else:
+                dominio.append(("date", ">=", limit_ago))
+            desconocidos = {}
+            for chunk in split_every(
+                DATA_BI_CHUNK, noches.search(dominio, order="line_id").ids
+            ):
+                for noche in noches.browse(chunk).read(
+                    noches._data_bi_row_fields, load=None
+                ):
+                    fila = self._data_bi_reservas_row(
+                        noche, estado_array, fecha_extraccion
+                    )
+                    if fila["ID_Pais"] not in paises:
+                        desconocidos[fila["ID_Pais"]] = (
+                            desconocidos.get(fila["ID_Pais"], 0) + 1
+                        )
+                    yield fila
+                self.invalidate_cache()
+            if desconocidos:
+                _logger.warning(
+                    "DataBi %s: ID_Pais not in the country table (nights) %s",
+                    prop.name,
+                    desconocidos,
                 )
-                # and (n.price > 0)
+
+    @api.model
+    def _data_bi_reservas_row(self, noche, estado_array, fecha_extraccion):
+        """Reservas row of the values of a data_bi.reservation.night."""
+        # ID_Reserva numérico Código único de la reserva
+        # ID_Hotel numérico Código del Hotel
+        # ID_EstadoReserva numérico Código del estado de la reserva
+        # FechaVenta fecha Fecha de la venta de la reserva
+        # ID_Segmento numérico Código del Segmento de la reserva
+        # ID_Cliente Numérico Código del Cliente de la reserva
+        # ID_Canal numérico Código del Canal
+        # FechaExtraccion fecha Fecha de la extracción de los datos (Foto)
+        # Entrada fecha Fecha de entrada
+        # Salida fecha Fecha de salida
+        # Noches numérico Nro. de noches de la reserva
+        # ID_TipoHabitacion numérico Código del Tipo de Habitación
+        # ID_Regimen numérico Código del Tipo de Régimen
+        # Adultos numérico Nro. de adultos
+        # Menores numérico Nro. de menores
+        # Cunas numérico Nro. de cunas
+        # PrecioDiario numérico con 2 decimales Precio por noche de la reserva
+        # ID_Tarifa numérico Código de la tarifa aplicada a la reserva
+        # ID_Pais alfanumérico Código del país
+        return {
+            "ID_Reserva": noche["reservation_id"],
+            "ID_Hotel": noche["pms_property_id"],
+            "ID_EstadoReserva": estado_array.index(noche["state"]),
+            "FechaVenta": noche["sale_date"].strftime("%Y-%m-%d"),
+            "ID_Segmento": noche["segment_id"],
+            "ID_Cliente": noche["client_id"],
+            "ID_Canal": noche["channel_id"],
+            "FechaExtraccion": fecha_extraccion,
+            "Entrada": noche["date"].strftime("%Y-%m-%d"),
+            "Salida": (noche["date"] + timedelta(days=1)).strftime("%Y-%m-%d"),
+            "Noches": 1,
+            "ID_TipoHabitacion": noche["room_type_id"],
+            "ID_HabitacionDuerme": noche["sleep_room_type_id"],
+            "ID_Regimen": noche["board_service_room_id"],
+            "Adultos": noche["adults"],
+            "Menores": noche["children"],
+            "Cunas": noche["cribs"],
+            "PrecioDiario": noche["price"],
+            "PrecioDto": noche["price_discount"],
+            "PrecioComision": noche["price_commission"],
+            "PrecioIva": noche["price_tax"],
+            "ID_Tarifa": noche["pricelist_id"],
+            "ID_Pais": noche["ine_code"],
+            "ID_Room": noche["room_id"],
+            "FechaCancelacion": (
+                noche["cancel_date"].strftime("%Y-%m-%d")
+                if noche["cancel_date"]
+                else "NONE"
+            ),
+            "ID_Folio": noche["folio_name"],
+        }
+
+    @api.model
+    def _data_bi_night_values(self, lines, ine_codes=None):
+        """Yield the data_bi.reservation.night values of ``lines``.
+
+        Only the nights of normal reservations are yielded. ``ine_codes``
+        is the memo of data_bi_ine_codes, to share it between chunks.
+        """
+        # Los datos se leen por lotes (un read por modelo) y se calculan
+        # en memoria, evitando las cargas perezosas linea a linea.
+        lineas = lines.read(
+            [
+                "pms_property_id",
+                "reservation_id",
+                "date",
+                "price",
+                "discount",
+                "room_id",
+            ],
+            load=None,
+        )
+        reservas = self._data_bi_read(
+            "pms.reservation",
+            [linea["reservation_id"] for linea in lineas],
+            [
+                "reservation_type",
+                "state",
+                "create_date",
+                "write_date",
+                "segmentation_ids",
+                "folio_id",
+                "board_service_room_id",
+                "service_ids",
+                "sale_channel_origin_id",
+                "agency_id",
+                "commission_amount",
+                "reservation_line_ids",
+                "tax_ids",
+                "room_type_id",
+                "adults",
+                "children",
+                "pricelist_id",
+            ],
+        )
+        reservas = {
+            res_id: reserva
+            for res_id, reserva in reservas.items()
+            if reserva["reservation_type"] == "normal"
+        }
+        folios = self._data_bi_read(
+            "pms.folio",
+            [reserva["folio_id"] for reserva in reservas.values()],
+            ["name", "segmentation_ids"],
+        )
+        servicios = self._data_bi_read(
+            "pms.service",
+            [sid for reserva in reservas.values() for sid in reserva["service_ids"]],
+            ["product_id"],
+        )
+        productos = self._data_bi_read(
+            "product.product",
+            [servicio["product_id"] for servicio in servicios.values()],
+            ["is_crib"],
+        )
+        impuestos = self._data_bi_read(
+            "account.tax",
+            [tid for reserva in reservas.values() for tid in reserva["tax_ids"]],
+            ["amount"],
+        )
+        habitaciones = self._data_bi_read(
+            "pms.room", [linea["room_id"] for linea in lineas], ["room_type_id"]
+        )
+        paises = self.data_bi_ine_codes(list(reservas), ine_codes)
+
+        for linea in lineas:
+            if linea["reservation_id"] not in reservas:
+                continue
+            reserva = reservas[linea["reservation_id"]]
+            folio = folios.get(reserva["folio_id"])
+            if reserva["segmentation_ids"]:
+                id_segmen = reserva["segmentation_ids"][0]
+            elif folio and folio["segmentation_ids"]:
+                id_segmen = folio["segmentation_ids"][0]
+            else:
+                id_segmen = 0
+
+            regimen = (
+                0
+                if not reserva["board_service_room_id"]
+                else reserva["board_service_room_id"]
             )
-            # _logger.info(
-            #     "DataBi: Calculating %s reservations in %s ",
-            #     str(len(lineas)),
-            #     prop.name,
-            # )
-
-            for linea in lineas:
-                if linea.reservation_id.segmentation_ids:
-                    id_segmen = linea.reservation_id.segmentation_ids[0].id
-                elif linea.reservation_id.folio_id.segmentation_ids:
-                    id_segmen = linea.reservation_id.folio_id.segmentation_ids[0].id
-                else:
-                    id_segmen = 0
-
-                regimen = (
-                    0
-                    if not linea.reservation_id.board_service_room_id
-                    else linea.reservation_id.board_service_room_id.id
-                )
 
-                cuna = 0
-                for service in linea.reservation_id.service_ids:
-                    if service.product_id.is_crib:
-                        cuna += 1
+            cuna = 0
+            for service_id in reserva["service_ids"]:
+                producto = productos.get(servicios[service_id]["product_id"])
+                if producto and producto["is_crib"]:
+                    cuna += 1
 
-                canal = (
-                    linea.reservation_id.sale_channel_origin_id.id
-                    if linea.reservation_id.sale_channel_origin_id.id
-                    else 0
-                )
+            canal = (
+                reserva["sale_channel_origin_id"]
+                if reserva["sale_channel_origin_id"]
+                else 0
+            )
 
-                cliente = (
-                    linea.reservation_id.agency_id.id
-                    if linea.reservation_id.agency_id.id
-                    else 0
-                )
-                cliente = canal if cliente == 0 else cliente
+            cliente = reserva["agency_id"] if reserva["agency_id"] else 0
+            cliente = canal if cliente == 0 else cliente
 
-                precio_comision = round(
-                    linea.reservation_id.commission_amount
-                    / len(linea.reservation_id.reservation_line_ids),
-                    2,
+            precio_comision = round(
+                reserva["commission_amount"] / len(reserva["reservation_line_ids"]),
+                2,
+            )
+            precio_iva = 0
+            for tax_id in reserva["tax_ids"]:
+                precio_iva += round(
+                    impuestos[tax_id]["amount"] * linea["price"] / 100, 2
                 )
-                precio_iva = 0
-                for iva in linea.reservation_id.tax_ids:
-                    precio_iva += round(iva.amount * linea.price / 100, 2)
 
-                dic_reservas.append(
-                    {
-                        "ID_Reserva": linea.reservation_id.id,
-                        "ID_Hotel": prop.id,
-                        "ID_EstadoReserva": estado_array.index(
-                            linea.reservation_id.state
-                        ),
-                        "FechaVenta": linea.reservation_id.create_date.strftime(
-                            "%Y-%m-%d"
-                        ),
-                        "ID_Segmento": id_segmen,
-                        "ID_Cliente": cliente,
-                        "ID_Canal": canal,
-                        "FechaExtraccion": date.today().strftime("%Y-%m-%d"),
-                        "Entrada": linea.date.strftime("%Y-%m-%d"),
-                        "Salida": (linea.date + timedelta(days=1)).strftime("%Y-%m-%d"),
-                        "Noches": 1,
-                        "ID_TipoHabitacion": linea.reservation_id.room_type_id.id,
-                        "ID_HabitacionDuerme": linea.room_id.room_type_id.id,
-                        "ID_Regimen": regimen,
-                        "Adultos": linea.reservation_id.adults,
-                        "Menores": linea.reservation_id.children,
-                        "Cunas": cuna,
-                        "PrecioDiario": linea.price - precio_comision - precio_iva,
-                        "PrecioDto": linea.discount * (linea.price / 100),
-                        "PrecioComision": precio_comision,
-                        "PrecioIva": precio_iva,
-                        "ID_Tarifa": linea.reservation_id.pricelist_id.id,
-                        "ID_Pais": self.data_bi_get_codeine(linea),
-                        "ID_Room": linea.room_id.id,
-                        "FechaCancelacion": "NONE",
-                        "ID_Folio": linea.reservation_id.folio_id.name,
-                    }
-                )
+            habitacion = habitaciones.get(linea["room_id"])
+            yield {
+                "line_id": linea["id"],
+                "reservation_id": reserva["id"],
+                "pms_property_id": linea["pms_property_id"],
+                "date": linea["date"],
+                "state": reserva["state"],
+                "sale_date": reserva["create_date"].date(),
+                "segment_id": id_segmen,
+                "client_id": cliente,
+                "channel_id": canal,
+                "room_type_id": reserva["room_type_id"],
+                "sleep_room_type_id": (
+                    habitacion["room_type_id"] if habitacion else False
+                ),
+                "board_service_room_id": regimen,
+                "adults": reserva["adults"],
+                "children": reserva["children"],
+                "cribs": cuna,
+                "price": linea["price"] - precio_comision - precio_iva,
+                "price_discount": linea["discount"] * (linea["price"] / 100),
+                "price_commission": precio_comision,
+                "price_tax": precio_iva,
+                "pricelist_id": reserva["pricelist_id"],
+                "ine_code": paises[reserva["id"]],
+                "room_id": linea["room_id"],
+                "cancel_date": (
+                    reserva["write_date"].date()
+                    if reserva["state"] == "cancel"
+                    else False
+                ),
+                "folio_name": folio["name"] if folio else False,
+            }
 
-                if linea.reservation_id.state == "cancel":
-                    dic_reservas[-1][
-                        "FechaCancelacion"
-                    ] = linea.reservation_id.write_date.strftime("%Y-%m-%d")
-
-                # ID_Reserva numérico Código único de la reserva
-                # ID_Hotel numérico Código del Hotel
-                # ID_EstadoReserva numérico Código del estado de la reserva
-                # FechaVenta fecha Fecha de la venta de la reserva
-                # ID_Segmento numérico Código del Segmento de la reserva
-                # ID_Cliente Numérico Código del Cliente de la reserva
-                # ID_Canal numérico Código del Canal
-                # FechaExtraccion fecha Fecha de la extracción de los datos (Foto)
-                # Entrada fecha Fecha de entrada
-                # Salida fecha Fecha de salida
-                # Noches numérico Nro. de noches de la reserva
-                # ID_TipoHabitacion numérico Código del Tipo de Habitación
-                # ID_Regimen numérico Código del Tipo de Régimen
-                # Adultos numérico Nro. de adultos
-                # Menores numérico Nro. de menores
-                # Cunas numérico Nro. de cunas
-                # PrecioDiario numérico con 2 decimales Precio por noche de la reserva
-                # ID_Tarifa numérico Código de la tarifa aplicada a la reserva
-                # ID_Pais alfanumérico Código del país
-
-        return dic_reservas
+    @api.model
+    def _data_bi_read(self, model, ids, fields):
+        """Read ``fields`` of ``model`` in batch, indexed by record id.
+
+        Relational fields are returned as raw ids (``load=None``).
+        """
+        ids = list({record_id for record_id in ids if record_id})
+        if not ids:
+            return {}
+        return {
+            vals["id"]: vals
+            for vals in self.env[model].browse(ids).read(fields, load=None)
+        }
+
+    @api.model
+    def data_bi_ine_codes(self, reservation_ids, memo=None):
+        """Return the INE code ('ID_Pais') of the reservations, {id: code}.
+
+        The code of the reservation partner or else of the last checkin
+        partner with one, 'NONE' without any. Each reservation is resolved
+        once with batched reads; the ones already in ``memo`` are not read
+        again and the new ones are added to it.
+        """
+        memo = {} if memo is None else memo
+        reservas = self._data_bi_read(
+            "pms.reservation",
+            [res_id for res_id in reservation_ids if res_id not in memo],
+            ["partner_id", "checkin_partner_ids"],
+        )
+        partners = self._data_bi_read(
+            "res.partner",
+            [reserva["partner_id"] for reserva in reservas.values()],
+            ["ine_code"],
+        )
+        sin_codigo = []
+        for reserva in reservas.values():
+            partner = partners.get(reserva["partner_id"])
+            if partner and partner["ine_code"]:
+                memo[reserva["id"]] = partner["ine_code"]
+            else:
+                sin_codigo.append(reserva)
+        # Checkins are only read for the reservations without partner code
+        checkins = self._data_bi_read(
+            "pms.checkin.partner",
+            [cid for reserva in sin_codigo for cid in reserva["checkin_partner_ids"]],
+            ["partner_id"],
+        )
+        partners.update(
+            self._data_bi_read(
+                "res.partner",
+                [
+                    checkin["partner_id"]
+                    for checkin in checkins.values()
+                    if checkin["partner_id"] not in partners
+                ],
+                ["ine_code"],
+            )
+        )
+        for reserva in sin_codigo:
+            memo[reserva["id"]] = "NONE"
+            # The last checkin partner with a code wins
+            for checkin_id in reversed(reserva["checkin_partner_ids"]):
+                partner = partners.get(checkins[checkin_id]["partner_id"])
+                if partner and partner["ine_code"]:
+                    memo[reserva["id"]] = partner["ine_code"]
+                    break
+        return {
+            res_id: memo[res_id] for res_id in reservation_ids if res_id in memo
+        }
 
     @api.model
     def data_bi_get_codeine(self, reserva):
-        response = "NONE"
-        if reserva.reservation_id.partner_id.ine_code:
-            response = reserva.reservation_id.partner_id.ine_code
-        else:
-            for partner in reserva.reservation_id.checkin_partner_ids:
-                if partner.partner_id.ine_code:
-                    response = partner.partner_id.ine_code
-        return response
+        reservation = reserva.reservation_id
+        return self.data_bi_ine_codes(reservation.ids).get(reservation.id, "NONE")
 
     @api.model
     def data_bi_get_capacidad(self, prop, rtype):
-        rooms = self.env["pms.room"].search(
+        rooms = self.env["pms.room"].search_count(
             [("pms_property_id", "=", prop), ("room_type_id", "=", rtype)]
         )
-        return len(rooms)
+        return rooms
 
     @api.model
     def data_bi_ftp_general(self):
@@ -1089,58 +1326,166 @@ class DataBi(models.Model):
         return
 
     @api.model
-    def data_bi_ftp(self, default_property=[0], fechafoto=False):
+    def data_bi_transport(self):
+        """FTP/SFTP transport with the DataBi server of the user."""
+        if not self.env.user.valid_ftp_bi:
+            _logger.error("FTP data not validated in user")
+            _logger.error(self.env.user.name)
+            return False
+        return DataBiTransport(
+            self.env.user.url_ftp_bi,
+            self.env.user.user_ftp_bi,
+            self.env.user.pass_ftp_bi,
+        )
+
+    @api.model
+    def data_bi_ftp(
+        self, default_property=[0], fechafoto=False, parallel=False, delta=False
+    ):
         """send DataBI from all property to ftp server
         default_property is a list of propertys ids
         example: default_property = [1,4,5]
         for all not set or default_property = [0]
+        parallel = True to export the propertys in queue jobs,
+        see data_bi_ftp_parallel
+        delta = True to send only the changes since the last export,
+        see data_bi_ftp_one
         """
         _logger.info("Exporting FTP data DataBI")
         #propertys = self.env["pms.property"].search([])
         propertys = self.env["pms.property"].search([("status_send_property", "=", True)])
-        for prop in propertys:
-            if (prop.id in default_property) or default_property == [0]:
-                self.data_bi_ftp_one(prop, fechafoto)
-            self.invalidate_cache()
+        if parallel:
+            self.data_bi_ftp_parallel(
+                propertys.filtered(
+                    lambda p: p.id in default_property or default_property == [0]
+                ),
+                fechafoto,
+                delta,
+            )
+            return
+        transport = self.data_bi_transport()
+        if not transport:
+            return
+        with transport:
+            for prop in propertys:
+                if (prop.id in default_property) or default_property == [0]:
+                    self.data_bi_ftp_one(prop, fechafoto, delta, transport)
+                self.invalidate_cache()
         return
 
     @api.model
-    def data_bi_ftp_one(self, prop, fechafoto):
-        """ send 1 DataBI to ftp server """
-        data = json.dumps(
-            self.export_all(prop, self.calc_date_limit(fechafoto)), ensure_ascii=False
+    def data_bi_ftp_parallel(self, propertys, fechafoto=False, delta=False):
+        """Send DataBI of each property in its own queue job.
+
+        All the jobs are queued at once in the channel root.data_bi; its
+        capacity (queue_job channels configuration) limits how many
+        propertys are exported at the same time. Results are collected in a
+        data_bi.export.run record.
+        """
+        run = self.env["data_bi.export.run"].create(
+            {
+                "fechafoto": fechafoto or date.today().strftime("%Y-%m-%d"),
+                "line_ids": [(0, 0, {"pms_property_id": p.id}) for p in propertys],
+            }
+        )
+        for run_line in run.line_ids:
+            job = self.with_delay(
+                description="DataBI FTP %s" % run_line.pms_property_id.name
+            ).data_bi_ftp_job(run_line, fechafoto, delta)
+            run_line.job_uuid = job.uuid
+        _logger.info("DataBI FTP run %s: %s propertys", run.name, len(propertys))
+        return run
+
+    def data_bi_ftp_job(self, run_line, fechafoto, delta=False):
+        """Send the property of ``run_line`` and keep its result."""
+        start = time.time()
+        vals = {"state": "done"}
+        transport = self.data_bi_transport()
+        try:
+            with self.env.cr.savepoint():
+                if not transport or not self.data_bi_ftp_one(
+                    run_line.pms_property_id, fechafoto, delta, transport
+                ):
+                    vals = {"state": "failed", "error": "FTP upload failed"}
+        except Exception as e:
+            _logger.exception("DataBI FTP %s", run_line.pms_property_id.name)
+            vals = {"state": "failed", "error": "%s" % e}
+        finally:
+            if transport:
+                transport.close()
+        vals["duration"] = time.time() - start
+        if transport and transport.stats:
+            vals["size"] = transport.stats[-1]["bytes"]
+            vals["upload_time"] = transport.stats[-1]["seconds"]
+        run_line.write(vals)
+        return "%s: %s" % (run_line.pms_property_id.name, vals["state"])
+
+    @api.model
+    def data_bi_ftp_one(self, prop, fechafoto, delta=False, transport=False):
+        """send 1 DataBI to ftp server
+
+        With delta and a previous export, Reservas only has the nights
+        changed since then (file BI<id>-<code>-delta). The watermark of the
+        export (see _data_bi_snapshot_time) is kept in the property when the
+        file is sent.
+        transport = open DataBiTransport to reuse, a new one if not set
+        """
+        since = delta and prop.data_bi_watermark
+        formato = self.env.user.data_bi_format or "json"
+        inicio = self._data_bi_snapshot_time()
+        data = tempfile.SpooledTemporaryFile(max_size=DATA_BI_SPOOL_SIZE)
+        medidas = []
+        self.data_bi_write(
+            data,
+            self._data_bi_instrument(
+                self._data_bi_sections(
+                    prop, self.calc_date_limit(fechafoto), since=since
+                ),
+                medidas,
+                data,
+            ),
+            formato,
         )
+        self.env["data_bi.section.stat"].record(medidas, prop, "ftp")
+        data.seek(0)
         filename = (
             "BI"
             + str(prop.id)
             + "-"
             + (prop.pms_property_code if prop.pms_property_code else "00")
+            + ("-delta" if since else "")
         )
         _logger.info("Send to ftp " + filename)
-        self.data_bi_ftp_write(data, filename)
-        return
+        sent = self.data_bi_ftp_write(
+            data, filename, extension=DATA_BI_FORMATS[formato], transport=transport
+        )
+        data.close()
+        if sent:
+            prop.sudo().data_bi_watermark = inicio
+        return sent
 
     @api.model
-    def data_bi_ftp_write(self, data, file, directory="/"):
-        if not self.env.user.valid_ftp_bi:
-            _logger.error("FTP data not validated in user")
-            _logger.error(self.env.user.name)
-            return
-        try:
-            with ftplib.FTP(
-                host=self.env.user.url_ftp_bi,
-                user=self.env.user.user_ftp_bi,
-                passwd=self.env.user.pass_ftp_bi,
-            ) as ftp:
-                tfile = tempfile.NamedTemporaryFile("w+b")
-                tfile.write(bytes(data, "utf-8"))
-                tfile.flush()
-                tfile.seek(0)
-                ftpResponseMessage = ftp.storbinary(
-                    "STOR " + directory + file + ".json", tfile
+    def data_bi_ftp_write(
+        self, data, file, directory="/", extension=".json", transport=False
+    ):
+        """Upload ``data`` (a string or a binary file object) as json.
+
+        Return True when the file was stored on the server.
+        transport = open DataBiTransport to reuse, a new one if not set
+        """
+        if not transport:
+            transport = self.data_bi_transport()
+            if not transport:
+                return False
+            with transport:
+                return self.data_bi_ftp_write(
+                    data, file, directory, extension, transport
                 )
-                _logger.warning(ftpResponseMessage)
-                ftp.close()
-                tfile.close()
-        except ftplib.all_errors as e:
+        if isinstance(data, str):
+            data = io.BytesIO(bytes(data, "utf-8"))
+        try:
+            transport.upload(data, directory + file + extension)
+        except transport.errors as e:
             _logger.error("%s" % e)
+            return False
+        return True
@@ -0,0 +1,201 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import logging
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from odoo import _, api, models
+from odoo.exceptions import AccessError
+
+_logger = logging.getLogger(__name__)
+
+
+class _ByteCounter(object):
+    """Text stream that only counts the utf-8 bytes written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text.encode("utf-8"))
+
+    def tell(self):
+        return self.size
+
+
+class DataBi(models.Model):
+    _inherit = "data_bi"
+
+    @api.model
+    def _data_bi_benchmark_check(self):
+        if not self.env.is_superuser() and not self.env.user.has_group(
+            "base.group_system"
+        ):
+            raise AccessError(_("Only administrators can run the DataBi benchmark."))
+
+    @api.model
+    def _data_bi_benchmark_populate(
+        self,
+        num_properties=2,
+        num_room_types=3,
+        num_rooms=20,
+        num_reservations=200,
+        max_nights=7,
+        seed=42,
+    ):
+        """Create synthetic hotels to measure the DataBi export.
+
+        Only for test databases: creates ``num_properties`` propertys with
+        ``num_room_types`` room types, ``num_rooms`` rooms and
+        ``num_reservations`` reservations each, with crib services,
+        segmentation and checkin partners. Return the new property ids.
+        """
+        self._data_bi_benchmark_check()
+        rnd = random.Random(seed)
+        env = self.with_context(tracking_disable=True).env
+        pricelist = env["product.pricelist"].search([], limit=1)
+        channel = env["pms.sale.channel"].create(
+            {"name": "DataBi benchmark", "channel_type": "direct"}
+        )
+        segment = env["res.partner.category"].create({"name": "DataBi benchmark"})
+        crib = env["product.product"].create(
+            {"name": "DataBi benchmark crib", "type": "service", "is_crib": True}
+        )
+        room_class = env["pms.room.type.class"].create(
+            {"name": "DataBi benchmark", "default_code": "DBB"}
+        )
+        partners = env["res.partner"].create(
+            [{"name": "DataBi benchmark guest %s" % i} for i in range(50)]
+        )
+        propertys = env["pms.property"]
+        for num_property in range(num_properties):
+            prop = env["pms.property"].create(
+                {
+                    "name": "DataBi benchmark %s" % num_property,
+                    "company_id": env.company.id,
+                    "default_pricelist_id": pricelist.id,
+                }
+            )
+            propertys |= prop
+            room_types = env["pms.room.type"].create(
+                [
+                    {
+                        "name": "DBB %s-%s" % (num_property, i),
+                        "default_code": "DBB%s%s" % (num_property, i),
+                        "class_id": room_class.id,
+                        "pms_property_ids": [(6, 0, prop.ids)],
+                        "list_price": rnd.randint(40, 200),
+                    }
+                    for i in range(num_room_types)
+                ]
+            )
+            env["pms.room"].create(
+                [
+                    {
+                        "name": "%s-%s" % (num_property, i),
+                        "pms_property_id": prop.id,
+                        "room_type_id": room_types[i % len(room_types)].id,
+                        "capacity": 2,
+                    }
+                    for i in range(num_rooms)
+                ]
+            )
+            for __ in range(num_reservations):
+                checkin = date.today() - timedelta(days=rnd.randint(0, 50))
+                vals = {
+                    "pms_property_id": prop.id,
+                    "partner_id": rnd.choice(partners).id,
+                    "room_type_id": rnd.choice(room_types).id,
+                    "checkin": checkin,
+                    "checkout": checkin + timedelta(days=rnd.randint(1, max_nights)),
+                    "adults": rnd.randint(1, 2),
+                    "pricelist_id": pricelist.id,
+                    "sale_channel_origin_id": channel.id,
+                    "segmentation_ids": [(6, 0, segment.ids)],
+                }
+                if rnd.random() < 0.1:
+                    vals["service_ids"] = [(0, 0, {"product_id": crib.id})]
+                env["pms.reservation"].create(vals)
+        _logger.info(
+            "DataBi benchmark data: %s propertys, %s reservations",
+            num_properties,
+            num_properties * num_reservations,
+        )
+        return propertys.ids
+
+    @api.model
+    def _data_bi_benchmark(
+        self, hotelsdata=None, fechafoto=False, baseline=False, threshold=0.2
+    ):
+        """Measure the nights refresh and every DataBi section of export_all.
+
+        Return a dict by section with seconds, SQL queries, rows, bytes of
+        json and peak python memory (traced, so times are slower than in a
+        normal export but comparable between runs). The refresh of the
+        reservation nights, run first, is under "Refresh" (rows = nights of
+        the hotels, no bytes). With ``baseline`` (a
+        previous result) the sections whose seconds or queries grow more
+        than ``threshold`` (0.2 = 20%) are listed under "regressions".
+        """
+        self._data_bi_benchmark_check()
+        hotels = self.calc_hoteles(hotelsdata or [0])
+        limit_ago = self.calc_date_limit(fechafoto)
+        cr = self.env.cr
+        noches = self.env["data_bi.reservation.night"]
+        self.invalidate_cache()
+        tracemalloc.start()
+        queries = cr.sql_log_count
+        inicio = time.perf_counter()
+        noches.refresh(hotels)
+        segundos = time.perf_counter() - inicio
+        queries = cr.sql_log_count - queries
+        __, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        informe = {
+            "Refresh": {
+                "seconds": segundos,
+                "queries": queries,
+                "rows": noches.search_count([("pms_property_id", "in", hotels.ids)]),
+                "bytes": 0,
+                "peak_memory": pico,
+            }
+        }
+        for nombre, filas in self._data_bi_sections(hotels, limit_ago):
+            self.invalidate_cache()
+            contador = _ByteCounter()
+            tracemalloc.start()
+            queries = cr.sql_log_count
+            inicio = time.perf_counter()
+            medidas = []
+            self.data_bi_write_json(
+                contador,
+                self._data_bi_instrument([(nombre, filas)], medidas, contador),
+            )
+            segundos = time.perf_counter() - inicio
+            queries = cr.sql_log_count - queries
+            __, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            informe[nombre] = {
+                "seconds": segundos,
+                "queries": queries,
+                "rows": medidas[0]["rows"],
+                "bytes": contador.size,
+                "peak_memory": pico,
+            }
+        regresiones = []
+        for nombre, medida in informe.items():
+            anterior = (baseline or {}).get(nombre)
+            if not anterior:
+                continue
+            for clave in ("seconds", "queries"):
+                if medida[clave] > anterior[clave] * (1 + threshold):
+                    regresiones.append(
+                        "%s %s: %s -> %s"
+                        % (nombre, clave, anterior[clave], medida[clave])
+                    )
+        for regresion in regresiones:
+            _logger.warning("DataBi benchmark regression %s", regresion)
+        informe["regressions"] = regresiones
+        return informe
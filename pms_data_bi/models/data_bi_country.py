@@ -0,0 +1,23 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo import fields, models
+
+
+class DataBiCountry(models.Model):
+    """INE countries and Spanish provinces of the DataBI 'Pais' section"""
+
+    _name = "data_bi.country"
+    _inherit = ["data_bi.dimension.mixin"]
+    _description = "DataBI country"
+    _order = "sequence, id"
+
+    _data_bi_fields = {"sequence", "code", "name"}
+
+    sequence = fields.Integer(default=10)
+    code = fields.Char("INE code", required=True)
+    name = fields.Char("Description", required=True)
+
+    _sql_constraints = [
+        ("code_uniq", "unique(code)", "The INE code must be unique"),
+    ]
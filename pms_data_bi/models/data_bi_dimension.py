@@ -0,0 +1,84 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo import api, models
+
+
+class DataBiDimensionMixin(models.AbstractModel):
+    """Clear the DataBI master data cache when the records change"""
+
+    _name = "data_bi.dimension.mixin"
+    _description = "DataBI master data"
+
+    # Fields used by the DataBI master data sections
+    _data_bi_fields = {"name", "active", "pms_property_ids"}
+
+    def _data_bi_is_dimension(self):
+        return bool(self)
+
+    def _data_bi_clear_cache(self):
+        if self._data_bi_is_dimension():
+            self.env["data_bi"].clear_caches()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._data_bi_clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._data_bi_fields.intersection(vals):
+            self._data_bi_clear_cache()
+        return res
+
+    def unlink(self):
+        self._data_bi_clear_cache()
+        return super().unlink()
+
+
+class ProductPricelist(models.Model):
+    _name = "product.pricelist"
+    _inherit = ["product.pricelist", "data_bi.dimension.mixin"]
+
+
+class PmsSaleChannel(models.Model):
+    _name = "pms.sale.channel"
+    _inherit = ["pms.sale.channel", "data_bi.dimension.mixin"]
+
+
+class PmsBoardService(models.Model):
+    _name = "pms.board.service"
+    _inherit = ["pms.board.service", "data_bi.dimension.mixin"]
+
+
+class PmsRoomType(models.Model):
+    _name = "pms.room.type"
+    _inherit = ["pms.room.type", "data_bi.dimension.mixin"]
+
+
+class RoomClosureReason(models.Model):
+    _name = "room.closure.reason"
+    _inherit = ["room.closure.reason", "data_bi.dimension.mixin"]
+
+
+class PmsRoom(models.Model):
+    _name = "pms.room"
+    _inherit = ["pms.room", "data_bi.dimension.mixin"]
+
+    # Rooms also give the capacity of the room types
+    _data_bi_fields = {
+        "name",
+        "active",
+        "pms_property_id",
+        "room_type_id",
+        "capacity",
+    }
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "room_type_id" in vals:
+            self.env["data_bi.reservation.night"].mark_dirty(
+                [("room_id", "in", self.ids)]
+            )
+        return res
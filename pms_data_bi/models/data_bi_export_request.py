@@ -0,0 +1,205 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import logging
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from odoo import api, fields, models
+
+from .data_bi import DATA_BI_FORMATS, DATA_BI_SPOOL_SIZE
+
+_logger = logging.getLogger(__name__)
+
+DATA_BI_MIMETYPES = {
+    "json": "application/json",
+    "jsonl.gz": "application/gzip",
+    "csv.zip": "application/zip",
+}
+
+
+class DataBiExportRequest(models.Model):
+    """Asynchronous DataBI export: its queue job and its result file"""
+
+    _name = "data_bi.export.request"
+    _description = "DataBI export request"
+    _order = "create_date desc"
+
+    token = fields.Char(
+        required=True,
+        readonly=True,
+        index=True,
+        copy=False,
+        default=lambda self: uuid.uuid4().hex,
+    )
+    key = fields.Char("Cache key", readonly=True, index=True)
+    user_id = fields.Many2one(
+        "res.users", readonly=True, default=lambda self: self.env.user
+    )
+    archivo = fields.Char(
+        readonly=True,
+        help="Archivo of export_data_bi, or 'general' for export_general_data",
+    )
+    property_ids = fields.Many2many("pms.property", string="Properties", readonly=True)
+    fechafoto = fields.Char("Photo date", readonly=True)
+    formato = fields.Char("Format", readonly=True)
+    state = fields.Selection(
+        [("pending", "Pending"), ("done", "Done"), ("failed", "Failed")],
+        default="pending",
+        readonly=True,
+    )
+    job_uuid = fields.Char("Job", readonly=True)
+    attachment_id = fields.Many2one("ir.attachment", readonly=True)
+    size = fields.Integer("Bytes", readonly=True)
+    duration = fields.Float("Time (s)", readonly=True)
+    error = fields.Text(readonly=True)
+
+    _sql_constraints = [
+        ("token_uniq", "unique(token)", "The export token must be unique"),
+    ]
+
+    @api.model
+    def request_export(self, archivo, hotels, fechafoto=False, formato="json"):
+        """Return the request of an export, queueing it if needed.
+
+        A request of the same user, archivo, properties, fechafoto and
+        formato created today and not failed is reused.
+        """
+        if not isinstance(fechafoto, str) or not fechafoto:
+            fechafoto = fields.Date.to_string(fields.Date.today())
+        key = "%s|%s|%s|%s|%s" % (
+            self.env.uid,
+            archivo,
+            ",".join(str(hotel_id) for hotel_id in sorted(hotels.ids)),
+            fechafoto,
+            formato,
+        )
+        request = self.search(
+            [
+                ("key", "=", key),
+                ("state", "!=", "failed"),
+                (
+                    "create_date",
+                    ">=",
+                    datetime.combine(fields.Date.today(), datetime.min.time()),
+                ),
+            ],
+            limit=1,
+        )
+        if request and request.get_status()["state"] != "failed":
+            return request
+        request = self.create(
+            {
+                "key": key,
+                "archivo": str(archivo),
+                "property_ids": [(6, 0, hotels.ids)],
+                "fechafoto": fechafoto,
+                "formato": formato,
+            }
+        )
+        job = request.with_delay(
+            description="DataBI export %s %s" % (archivo, fechafoto)
+        ).export_job()
+        request.job_uuid = job.uuid
+        return request
+
+    def export_job(self):
+        """Build the export file and keep it as an attachment."""
+        self.ensure_one()
+        data_bi = self.env["data_bi"]
+        start = time.time()
+        try:
+            with self.env.cr.savepoint(), tempfile.SpooledTemporaryFile(
+                max_size=DATA_BI_SPOOL_SIZE
+            ) as data:
+                if self.archivo == "general":
+                    data.write(
+                        data_bi.export_general_data(
+                            self.property_ids[:1].id or False
+                        ).encode("utf-8")
+                    )
+                    extension = ".json"
+                else:
+                    archivo = int(self.archivo)
+                    medidas = []
+                    data_bi.data_bi_write(
+                        data,
+                        data_bi._data_bi_instrument(
+                            data_bi._data_bi_sections(
+                                self.property_ids,
+                                data_bi.calc_date_limit(self.fechafoto),
+                                archivos=None if archivo == 0 else {archivo},
+                            ),
+                            medidas,
+                            data,
+                        ),
+                        self.formato,
+                    )
+                    self.env["data_bi.section.stat"].record(
+                        medidas,
+                        len(self.property_ids) == 1 and self.property_ids,
+                        "async",
+                    )
+                    extension = DATA_BI_FORMATS[self.formato]
+                data.seek(0)
+                attachment = self.env["ir.attachment"]._create_from_stream(
+                    data,
+                    {
+                        "name": "DataBI-%s%s" % (self.token, extension),
+                        "mimetype": DATA_BI_MIMETYPES.get(self.formato),
+                        "res_model": self._name,
+                        "res_id": self.id,
+                    },
+                )
+                vals = {
+                    "state": "done",
+                    "attachment_id": attachment.id,
+                    "size": attachment.file_size,
+                }
+        except Exception as e:
+            _logger.exception("DataBI export %s", self.key)
+            vals = {"state": "failed", "error": "%s" % e}
+        vals["duration"] = time.time() - start
+        self.write(vals)
+        return "%s: %s" % (self.key, vals["state"])
+
+    def get_status(self):
+        self.ensure_one()
+        state = self.state
+        if state == "pending" and self.job_uuid:
+            job = self.env["queue.job"].sudo().search(
+                [("uuid", "=", self.job_uuid)], limit=1
+            )
+            if job.state == "started":
+                state = "running"
+            elif job.state == "failed":
+                state = "failed"
+        return {
+            "token": self.token,
+            "state": state,
+            "size": self.size,
+            "error": self.error or False,
+            "url": self.state == "done" and "/data_bi/export/%s" % self.token,
+        }
+
+    def read_chunk(self, offset, size):
+        """Return ``size`` bytes of the result file from ``offset``."""
+        self.ensure_one()
+        attachment = self.attachment_id.sudo()
+        if attachment.store_fname:
+            with open(attachment._full_path(attachment.store_fname), "rb") as data:
+                data.seek(offset)
+                return data.read(size)
+        return attachment.raw[offset : offset + size]
+
+    def unlink(self):
+        self.mapped("attachment_id").sudo().unlink()
+        return super().unlink()
+
+    @api.model
+    def gc_requests(self, days=7):
+        """Remove the requests, and their files, older than ``days``."""
+        self.search(
+            [("create_date", "<", fields.Datetime.now() - timedelta(days=days))]
+        ).unlink()
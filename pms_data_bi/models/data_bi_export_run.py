@@ -0,0 +1,78 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo import api, fields, models
+
+
+class DataBiExportRun(models.Model):
+    """Parallel DataBI FTP export, one line per property"""
+
+    _name = "data_bi.export.run"
+    _description = "DataBI export run"
+    _order = "create_date desc"
+
+    name = fields.Char(
+        "Run", default=lambda self: fields.Datetime.to_string(fields.Datetime.now())
+    )
+    fechafoto = fields.Char("Photo date")
+    line_ids = fields.One2many("data_bi.export.run.line", "run_id", "Properties")
+    state = fields.Selection(
+        [("running", "Running"), ("done", "Done"), ("failed", "With errors")],
+        compute="_compute_summary",
+    )
+    count_total = fields.Integer("Properties", compute="_compute_summary")
+    count_done = fields.Integer("Sent", compute="_compute_summary")
+    count_failed = fields.Integer("Failed", compute="_compute_summary")
+    count_pending = fields.Integer("Pending", compute="_compute_summary")
+    duration = fields.Float("Total time (s)", compute="_compute_summary")
+
+    @api.depends("line_ids.state", "line_ids.duration")
+    def _compute_summary(self):
+        for run in self:
+            # A job that died without writing its line leaves it pending
+            states = [
+                "failed" if line.job_state == "failed" else line.state
+                for line in run.line_ids
+            ]
+            run.count_total = len(states)
+            run.count_done = states.count("done")
+            run.count_failed = states.count("failed")
+            run.count_pending = states.count("pending")
+            run.duration = sum(run.line_ids.mapped("duration"))
+            if run.count_pending:
+                run.state = "running"
+            elif run.count_failed:
+                run.state = "failed"
+            else:
+                run.state = "done"
+
+
+class DataBiExportRunLine(models.Model):
+    """Result of the DataBI FTP export of one property"""
+
+    _name = "data_bi.export.run.line"
+    _description = "DataBI export run property"
+
+    run_id = fields.Many2one(
+        "data_bi.export.run", required=True, ondelete="cascade", index=True
+    )
+    pms_property_id = fields.Many2one("pms.property", required=True, readonly=True)
+    state = fields.Selection(
+        [("pending", "Pending"), ("done", "Sent"), ("failed", "Failed")],
+        default="pending",
+        readonly=True,
+    )
+    duration = fields.Float("Time (s)", readonly=True)
+    size = fields.Integer("Bytes", readonly=True)
+    upload_time = fields.Float("Upload time (s)", readonly=True)
+    error = fields.Text(readonly=True)
+    job_uuid = fields.Char("Job", readonly=True, index=True)
+    job_state = fields.Char("Job state", compute="_compute_job_state")
+
+    def _compute_job_state(self):
+        jobs = self.env["queue.job"].sudo().search(
+            [("uuid", "in", self.filtered("job_uuid").mapped("job_uuid"))]
+        )
+        estados = {job.uuid: job.state for job in jobs}
+        for line in self:
+            line.job_state = estados.get(line.job_uuid, False)
@@ -0,0 +1,194 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import logging
+
+from psycopg2 import OperationalError
+
+from odoo import api, fields, models
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+from odoo.tools import split_every
+
+from .data_bi import DATA_BI_CHUNK
+
+_logger = logging.getLogger(__name__)
+# First key of the advisory locks of the refresh, the second is the property
+DATA_BI_NIGHT_LOCK = 731205
+
+
+class DataBiReservationNight(models.Model):
+    """Facts of the nights of the normal reservations, as exported in the
+    DataBI 'Reservas' section.
+
+    The table is kept up to date by refresh(): the nights whose line,
+    reservation, folio, services or checkins changed since the last refresh
+    of the property, and the nights marked dirty by the changes that do not
+    touch them (taxes, partner INE codes, room types), are recomputed. It
+    is run by its cron and by every export of Reservas for the propertys
+    exported, before reading the table.
+    """
+
+    _name = "data_bi.reservation.night"
+    _description = "DataBI reservation night"
+    _order = "pms_property_id, line_id"
+
+    # Fields needed to build a Reservas row (data_bi._data_bi_reservas_row)
+    _data_bi_row_fields = [
+        "reservation_id",
+        "pms_property_id",
+        "date",
+        "state",
+        "sale_date",
+        "segment_id",
+        "client_id",
+        "channel_id",
+        "room_type_id",
+        "sleep_room_type_id",
+        "board_service_room_id",
+        "adults",
+        "children",
+        "cribs",
+        "price",
+        "price_discount",
+        "price_commission",
+        "price_tax",
+        "pricelist_id",
+        "ine_code",
+        "room_id",
+        "cancel_date",
+        "folio_name",
+    ]
+
+    line_id = fields.Many2one(
+        "pms.reservation.line", required=True, index=True, ondelete="cascade"
+    )
+    reservation_id = fields.Many2one(
+        "pms.reservation", required=True, index=True, ondelete="cascade"
+    )
+    pms_property_id = fields.Many2one(
+        "pms.property", required=True, index=True, ondelete="cascade"
+    )
+    date = fields.Date(index=True)
+    state = fields.Char("Reservation state")
+    sale_date = fields.Date()
+    segment_id = fields.Integer("Segment")
+    client_id = fields.Integer("Client")
+    channel_id = fields.Integer("Channel")
+    room_type_id = fields.Many2one("pms.room.type")
+    sleep_room_type_id = fields.Many2one("pms.room.type", "Sleep room type")
+    board_service_room_id = fields.Integer("Board service")
+    adults = fields.Integer()
+    children = fields.Integer()
+    cribs = fields.Integer()
+    price = fields.Float("Net price")
+    price_discount = fields.Float("Discount")
+    price_commission = fields.Float("Commission")
+    price_tax = fields.Float("Tax")
+    pricelist_id = fields.Many2one("product.pricelist")
+    ine_code = fields.Char("INE code")
+    room_id = fields.Many2one("pms.room")
+    cancel_date = fields.Date()
+    folio_name = fields.Char("Folio")
+    dirty = fields.Boolean(index=True)
+
+    _sql_constraints = [
+        ("line_uniq", "unique(line_id)", "Only one DataBI night by reservation line")
+    ]
+
+    @api.model
+    def mark_dirty(self, domain):
+        """Recompute the nights of ``domain`` in the next refresh."""
+        self.sudo().search(domain + [("dirty", "=", False)]).write({"dirty": True})
+
+    @api.model
+    def refresh(self, hotels=None):
+        """Bring the nights of ``hotels`` (all the sent propertys if not set)
+        up to date. The first refresh of a property builds all its nights.
+
+        A property being refreshed by another transaction waits for it. The
+        watermark is written before the nights, so when that refresh was
+        committed after our snapshot the update fails with a concurrency
+        error, retried by Odoo or queue_job, instead of using stale nights.
+        """
+        if hotels is None:
+            hotels = self.env["data_bi"].calc_hoteles([0])
+        inicio = self.env["data_bi"]._data_bi_snapshot_time()
+        for prop in hotels:
+            # One refresh at a time for each property, without locking the
+            # property row (the writes of its lines take a key share lock)
+            self.env.cr.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)",
+                [DATA_BI_NIGHT_LOCK, prop.id],
+            )
+            watermark = prop.data_bi_night_watermark
+            prop.sudo().data_bi_night_watermark = inicio
+            prop.flush(["data_bi_night_watermark"])
+            if watermark:
+                dominio = self.env["data_bi"]._data_bi_delta_domain(
+                    prop, False, watermark
+                )
+            else:
+                dominio = [("pms_property_id", "=", prop.id)]
+            line_ids = set(self.env["pms.reservation.line"].search(dominio).ids)
+            line_ids.update(
+                noche["line_id"]
+                for noche in self.search_read(
+                    [("pms_property_id", "=", prop.id), ("dirty", "=", True)],
+                    ["line_id"],
+                    load=None,
+                )
+            )
+            ine_codes = {}
+            for chunk in split_every(DATA_BI_CHUNK, sorted(line_ids)):
+                self._refresh_lines(
+                    self.env["pms.reservation.line"].browse(chunk), ine_codes
+                )
+            _logger.info(
+                "DataBi nights of %s: %s lines refreshed", prop.name, len(line_ids)
+            )
+
+    @api.model
+    def cron_refresh(self):
+        """Refresh the sent propertys one by one, committing after each one
+        so its lock is not held until the end of the run."""
+        for prop in self.env["data_bi"].calc_hoteles([0]):
+            try:
+                self.refresh(prop)
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+            except OperationalError as e:
+                if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                    raise
+                self.env.cr.rollback()
+                self.env.clear()
+                _logger.info("DataBi nights of %s: refreshed meanwhile", prop.name)
+
+    def _refresh_lines(self, lines, ine_codes=None):
+        valores = {
+            vals["line_id"]: vals
+            for vals in self.env["data_bi"]._data_bi_night_values(lines, ine_codes)
+        }
+        existentes = {
+            noche["line_id"]: noche
+            for noche in self.search_read(
+                [("line_id", "in", lines.ids)],
+                self._data_bi_row_fields + ["line_id", "dirty"],
+                load=None,
+            )
+        }
+        # Lines that are no longer nights of a normal reservation
+        self.browse(
+            [
+                noche["id"]
+                for line_id, noche in existentes.items()
+                if line_id not in valores
+            ]
+        ).unlink()
+        nuevas = []
+        for line_id, vals in valores.items():
+            noche = existentes.get(line_id)
+            if not noche:
+                nuevas.append(vals)
+            elif noche["dirty"] or any(noche[key] != vals[key] for key in vals):
+                self.browse(noche["id"]).write(dict(vals, dirty=False))
+        self.create(nuevas)
+        self.flush()
+        self.invalidate_cache()
@@ -0,0 +1,86 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Previous measures of a section averaged to detect a regression
+DATA_BI_STATS_HISTORY = 7
+
+# Below these values a section is never reported as a regression
+DATA_BI_STATS_FLOOR = {"seconds": 1.0, "queries": 20}
+
+
+class DataBiSectionStat(models.Model):
+    """Time, queries, rows and bytes of a DataBI section in one export"""
+
+    _name = "data_bi.section.stat"
+    _description = "DataBI section statistics"
+    _order = "date desc, id"
+
+    date = fields.Datetime(default=fields.Datetime.now, readonly=True, index=True)
+    pms_property_id = fields.Many2one(
+        "pms.property", readonly=True, index=True, ondelete="cascade"
+    )
+    origin = fields.Selection(
+        [("ftp", "FTP"), ("async", "Asynchronous")], readonly=True
+    )
+    section = fields.Char(readonly=True, index=True)
+    seconds = fields.Float(readonly=True, group_operator="avg")
+    queries = fields.Integer("SQL queries", readonly=True, group_operator="avg")
+    rows = fields.Integer(readonly=True, group_operator="avg")
+    bytes = fields.Integer("File bytes", readonly=True, group_operator="avg")
+    regression = fields.Boolean(readonly=True)
+
+    @api.model
+    def record(self, medidas, prop=False, origin="ftp"):
+        """Keep the ``medidas`` of data_bi._data_bi_instrument.
+
+        A section is a regression when its seconds or queries are more than
+        the user threshold over the average of its last measures.
+        """
+        threshold = self.env.user.data_bi_stats_threshold
+        vals_list = []
+        for medida in medidas:
+            anteriores = self.search_read(
+                [
+                    ("section", "=", medida["section"]),
+                    ("pms_property_id", "=", prop.id if prop else False),
+                    ("origin", "=", origin),
+                ],
+                ["seconds", "queries"],
+                limit=DATA_BI_STATS_HISTORY,
+            )
+            regresion = False
+            for clave in ("seconds", "queries"):
+                if not anteriores or not threshold:
+                    break
+                media = sum(anterior[clave] for anterior in anteriores) / len(
+                    anteriores
+                )
+                if medida[clave] > max(
+                    DATA_BI_STATS_FLOOR[clave], media * (1 + threshold)
+                ):
+                    regresion = True
+                    _logger.warning(
+                        "DataBi regression %s %s %s: %.3f -> %.3f",
+                        prop.name if prop else "",
+                        medida["section"],
+                        clave,
+                        media,
+                        medida[clave],
+                    )
+            vals = dict(medida, origin=origin, regression=regresion)
+            vals["pms_property_id"] = prop.id if prop else False
+            vals_list.append(vals)
+        return self.sudo().create(vals_list)
+
+    @api.model
+    def gc_stats(self, days=180):
+        """Remove the statistics older than ``days``."""
+        self.search(
+            [("date", "<", fields.Datetime.now() - timedelta(days=days))]
+        ).unlink()
@@ -0,0 +1,44 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+
+class DataBiTombstone(models.Model):
+    """Reservation nights deleted, kept for the DataBI delta exports"""
+
+    _name = "data_bi.tombstone"
+    _description = "DataBI deleted reservation night"
+    _order = "id"
+
+    reservation_id = fields.Integer("Reservation ID", readonly=True)
+    pms_property_id = fields.Many2one(
+        "pms.property", readonly=True, index=True, ondelete="cascade"
+    )
+    date = fields.Date(readonly=True)
+
+    @api.model
+    def record_lines(self, lines):
+        """Keep a tombstone of each reservation line before unlinking it."""
+        self.sudo().create(
+            [
+                {
+                    "reservation_id": line.reservation_id.id,
+                    "pms_property_id": line.pms_property_id.id,
+                    "date": line.date,
+                }
+                for line in lines
+            ]
+        )
+
+    @api.model
+    def gc_tombstones(self, days=30):
+        """Remove the tombstones older than ``days``.
+
+        They are kept by age, not by FTP export, so a delta asked with an
+        older ``since`` than the last FTP export still gets its 'Bajas'.
+        """
+        self.sudo().search(
+            [("create_date", "<", fields.Datetime.now() - timedelta(days=days))]
+        ).unlink()
@@ -0,0 +1,16 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import models
+
+
+class AccountTax(models.Model):
+    _inherit = "account.tax"
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "amount" in vals:
+            # The tax amount gives the 'PrecioIva' of the reservation nights
+            self.env["data_bi.reservation.night"].mark_dirty(
+                [("reservation_id.tax_ids", "in", self.ids)]
+            )
+        return res
@@ -16,6 +16,20 @@ class InheritResCompany(models.Model):
         Example: 18 = 18% commission.",
     )
 
+    data_bi_watermark = fields.Datetime(
+        "Last DataBi export",
+        readonly=True,
+        help="Start time of the last DataBi export sent by FTP. The delta "
+        "export only sends the reservation nights changed after it.",
+    )
+
+    data_bi_night_watermark = fields.Datetime(
+        "Last DataBi nights refresh",
+        readonly=True,
+        help="Changes after this moment are recomputed in the next refresh "
+        "of the DataBi reservation nights of the property.",
+    )
+
     status_send_property = fields.Boolean(
         "Send property DataBi",
         default = True,
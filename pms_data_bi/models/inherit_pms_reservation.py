@@ -0,0 +1,20 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import models
+
+
+class PmsReservation(models.Model):
+    _inherit = "pms.reservation"
+
+    def unlink(self):
+        # The lines are removed by the database cascade, without their unlink
+        self.env["data_bi.tombstone"].record_lines(self.mapped("reservation_line_ids"))
+        return super().unlink()
+
+
+class PmsReservationLine(models.Model):
+    _inherit = "pms.reservation.line"
+
+    def unlink(self):
+        self.env["data_bi.tombstone"].record_lines(self)
+        return super().unlink()
@@ -5,7 +5,29 @@ from odoo import fields, models
 
 class ResPartner(models.Model):
 
-    _inherit = "res.partner"
+    _name = "res.partner"
+    _inherit = ["res.partner", "data_bi.dimension.mixin"]
+
+    # Agencies are the DataBi 'Clientes'
+    _data_bi_fields = {"name", "active", "pms_property_ids", "is_agency", "data_bi_ref"}
 
     # Fields declaration
     data_bi_ref = fields.Char(string="Reference to use in DataBi (MOP)", required=False)
+
+    def _data_bi_is_dimension(self):
+        return any(self.mapped("is_agency"))
+
+    def write(self, vals):
+        if vals.get("is_agency") is False and self._data_bi_is_dimension():
+            self.env["data_bi"].clear_caches()
+        res = super().write(vals)
+        if "ine_code" in vals:
+            # The INE code is the 'ID_Pais' of their reservation nights
+            self.env["data_bi.reservation.night"].mark_dirty(
+                [
+                    "|",
+                    ("reservation_id.partner_id", "in", self.ids),
+                    ("reservation_id.checkin_partner_ids.partner_id", "in", self.ids),
+                ]
+            )
+        return res
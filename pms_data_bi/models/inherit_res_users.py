@@ -17,6 +17,23 @@ class ResUsers(models.Model):
     user_ftp_bi = fields.Char('User FTP DataBi', required=False)
     pass_ftp_bi = fields.Char('Password FTP DataBi', required=False)
     valid_ftp_bi = fields.Boolean('Valid FTP DataBi', default=False)
+    data_bi_format = fields.Selection(
+        [
+            ("json", "JSON"),
+            ("jsonl.gz", "JSON Lines (gzip)"),
+            ("csv.zip", "CSV per section (zip)"),
+        ],
+        string="DataBi file format",
+        default="json",
+        help="Format of the DataBi files sent by FTP.",
+    )
+    data_bi_stats_threshold = fields.Float(
+        string="DataBi regression threshold",
+        default=0.5,
+        help="A DataBi section is logged as a regression when its time or "
+        "SQL queries grow more than this ratio (0.5 = 50%) over the average "
+        "of its last exports. 0 to disable.",
+    )
 
     def ftp_bi_test(self):
         _logger.info("Try FPT conection")
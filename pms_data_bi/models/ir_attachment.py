@@ -0,0 +1,67 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import hashlib
+import os
+import shutil
+import tempfile
+
+from odoo import api, models
+
+# Bytes read at a time when a file is stored from a stream
+STREAM_CHUNK = 4 * 1024 * 1024
+
+
+class IrAttachment(models.Model):
+    _inherit = "ir.attachment"
+
+    @api.model
+    def _file_write_stream(self, stream, checksum):
+        """_file_write of the binary ``stream``, copied by chunks.
+
+        The file is written under a temporary name and then renamed, so an
+        interrupted copy never leaves a truncated file under its checksum.
+        """
+        fname = checksum[:3] + "/" + checksum
+        if os.path.isfile(self._full_path(fname)):
+            return fname
+        fname = checksum[:2] + "/" + checksum
+        full_path = self._full_path(fname)
+        if not os.path.exists(full_path):
+            dirname = os.path.dirname(full_path)
+            os.makedirs(dirname, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=dirname, delete=False) as dest:
+                shutil.copyfileobj(stream, dest, STREAM_CHUNK)
+            os.replace(dest.name, full_path)
+            # add fname to checklist, in case the transaction aborts
+            self._mark_for_gc(fname)
+        return fname
+
+    @api.model
+    def _create_from_stream(self, stream, vals):
+        """Create an attachment of ``vals`` with the content of the binary
+        seekable ``stream`` (from its position), stored by chunks instead of
+        read whole in memory.
+
+        With the attachments in the database it has to be read to be kept
+        in db_datas.
+        """
+        if self._storage() != "file":
+            return self.create(dict(vals, raw=stream.read()))
+        start = stream.tell()
+        sha = hashlib.sha1()
+        size = 0
+        for chunk in iter(lambda: stream.read(STREAM_CHUNK), b""):
+            sha.update(chunk)
+            size += len(chunk)
+        checksum = sha.hexdigest()
+        stream.seek(start)
+        attachment = self.create(
+            dict(vals, store_fname=self._file_write_stream(stream, checksum))
+        )
+        # create drops file_size and checksum, they come from raw or datas
+        self.env.cr.execute(
+            "UPDATE ir_attachment SET file_size = %s, checksum = %s WHERE id = %s",
+            [size, checksum, attachment.id],
+        )
+        attachment.invalidate_cache(["file_size", "checksum"])
+        return attachment
@@ -0,0 +1 @@
+from .transport import DataBiTransport
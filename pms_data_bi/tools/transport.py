@@ -0,0 +1,171 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import ftplib
+import logging
+import posixpath
+import time
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+    _logger.debug("paramiko not installed, DataBi SFTP uploads disabled")
+
+# Errors after which the upload is retried on a new connection
+RETRY_ERRORS = ftplib.all_errors + (EOFError,)
+if paramiko is not None:
+    RETRY_ERRORS += (paramiko.SSHException,)
+# Permanent errors (login, permissions, missing directory) raised at once
+FATAL_ERRORS = (ftplib.error_perm, PermissionError, FileNotFoundError)
+
+
+class DataBiTransport(object):
+    """Upload DataBI files keeping one session for the whole run.
+
+    Each file is stored under a temporary name and then renamed, so the
+    server never exposes half written files. Failed uploads reconnect and
+    retry with an exponential backoff, except on FATAL_ERRORS. ``stats`` keeps the name, size,
+    time and attempts of every file sent.
+
+    url: FTP host, or sftp://host[:port] to use SFTP (needs paramiko)
+    connection_factory: callable returning a logged in ftplib.FTP like
+        object, used instead of ftplib.FTP (e.g. a local server stand-in)
+    """
+
+    # Errors raised by upload: FATAL_ERRORS at once, the rest after the retries
+    errors = RETRY_ERRORS
+
+    def __init__(
+        self,
+        url,
+        user,
+        passwd,
+        retries=3,
+        backoff=2,
+        timeout=60,
+        connection_factory=None,
+    ):
+        self.url = url
+        self.user = user
+        self.passwd = passwd
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.connection_factory = connection_factory
+        self.sftp = url.startswith("sftp://")
+        self.connection = None
+        self.stats = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        if self.connection is not None:
+            return self.connection
+        if self.connection_factory:
+            self.connection = self.connection_factory()
+        elif self.sftp:
+            if paramiko is None:
+                raise ftplib.Error("SFTP needs the paramiko python library")
+            host, __, port = self.url[len("sftp://") :].partition(":")
+            transport = paramiko.Transport((host, int(port or 22)))
+            transport.banner_timeout = self.timeout
+            transport.connect(username=self.user, password=self.passwd)
+            self.connection = paramiko.SFTPClient.from_transport(transport)
+        else:
+            self.connection = ftplib.FTP(
+                host=self.url, user=self.user, passwd=self.passwd, timeout=self.timeout
+            )
+        return self.connection
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            if self.sftp and not self.connection_factory:
+                self.connection.get_channel().get_transport().close()
+            else:
+                self.connection.quit()
+        except Exception:
+            _logger.debug("DataBi transport already closed", exc_info=True)
+        self.connection = None
+
+    def upload(self, fileobj, path):
+        """Store the binary ``fileobj`` (from its position) in ``path``."""
+        start = fileobj.tell()
+        fileobj.seek(0, 2)
+        size = fileobj.tell() - start
+        directory, name = posixpath.split(path)
+        temp_path = posixpath.join(directory, "." + name + ".part")
+        attempt = 0
+        while True:
+            attempt += 1
+            fileobj.seek(start)
+            begin = time.time()
+            try:
+                connection = self.connect()
+                if self.sftp and not self.connection_factory:
+                    connection.putfo(fileobj, temp_path)
+                    connection.posix_rename(temp_path, path)
+                else:
+                    connection.storbinary("STOR " + temp_path, fileobj)
+                    self._ftp_rename(connection, temp_path, path)
+                break
+            except FATAL_ERRORS:
+                self.close()
+                raise
+            except RETRY_ERRORS as e:
+                self.close()
+                if attempt > self.retries:
+                    raise
+                wait = self.backoff ** attempt
+                _logger.warning(
+                    "DataBi upload of %s failed (%s), retry %s in %ss",
+                    path,
+                    e,
+                    attempt,
+                    wait,
+                )
+                time.sleep(wait)
+        stat = {
+            "file": path,
+            "bytes": size,
+            "seconds": time.time() - begin,
+            "attempts": attempt,
+        }
+        self.stats.append(stat)
+        _logger.info(
+            "DataBi sent %s: %s bytes in %.2fs", path, size, stat["seconds"]
+        )
+        return stat
+
+    def _ftp_rename(self, connection, temp_path, path):
+        # Not every FTP server replaces the target on rename: then move the
+        # previous file aside, and only delete it once the new one is there
+        try:
+            connection.rename(temp_path, path)
+            return
+        except ftplib.error_perm as e:
+            error = e
+        directory, name = posixpath.split(path)
+        old_path = posixpath.join(directory, "." + name + ".old")
+        try:
+            connection.delete(old_path)
+        except ftplib.error_perm:
+            pass
+        try:
+            connection.rename(path, old_path)
+        except ftplib.error_perm:
+            # There is no previous file: the first error was not the target
+            raise error
+        try:
+            connection.rename(temp_path, path)
+        except ftplib.all_errors:
+            connection.rename(old_path, path)
+            raise
+        connection.delete(old_path)
@@ -4,7 +4,7 @@
 {
     "name": "PMS Data Bi Mapper V11.0",
     "summary": "Export hotel data for business intelligence mapping V11 instance",
-    "version": "14.0.3.1.0",
+    "version": "14.0.3.3.0",
     "license": "AGPL-3",
     "author": "Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>, "
     "Odoo Community Association (OCA)",
@@ -13,6 +13,7 @@
     "category": "Generic Modules/Property Management System",
     "data": [
         "views/migrated_hotel_views.xml",
+        "data/queue_data.xml",
         "data/ir_cron.xml",
     ],
     "demo": [],
@@ -0,0 +1,15 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """The cron is noupdate: push each node in its own job from now on,
+    unless its code was changed by hand."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cron = env.ref(
+        "pms_data_bi_v2_mapping.ir_cron_export_mop_v2_mapping",
+        raise_if_not_found=False,
+    )
+    if cron and cron.code.strip() == "model.cron_update_v2_mop_fields()":
+        cron.code = "model.cron_update_v2_mop_fields(parallel=True)"
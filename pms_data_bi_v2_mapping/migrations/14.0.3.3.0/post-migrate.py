@@ -0,0 +1,41 @@
+# Copyright 2023 Jose Luis Algara (Alda hotels) <osotranquilo@gmail.com>
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import logging
+
+from odoo import SUPERUSER_ID, api
+from odoo.tools.sql import column_exists
+
+_logger = logging.getLogger(__name__)
+
+OLD_COLUMNS = ("json_to_export_reservations_v2_data", "json_to_export_outs_v2_data")
+
+
+def migrate(cr, version):
+    """Move the V2 MOP payloads of the old Text columns to the gzipped
+    attachments, then drop the columns."""
+    if not all(column_exists(cr, "migrated_hotel", column) for column in OLD_COLUMNS):
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute(
+        """
+        SELECT id FROM migrated_hotel
+        WHERE json_to_export_reservations_v2_data IS NOT NULL
+            OR json_to_export_outs_v2_data IS NOT NULL
+        """
+    )
+    hotel_ids = [row[0] for row in cr.fetchall()]
+    # One hotel at a time, the payloads can be large
+    for hotel in env["migrated.hotel"].browse(hotel_ids):
+        cr.execute(
+            """
+            SELECT json_to_export_reservations_v2_data, json_to_export_outs_v2_data
+            FROM migrated_hotel WHERE id = %s
+            """,
+            [hotel.id],
+        )
+        reservas, bloqueos = cr.fetchone()
+        hotel._set_v2_mop_payloads(reservas or "", bloqueos or "")
+        hotel.invalidate_cache()
+    _logger.info("V2 MOP payloads of %s hotels moved to attachments", len(hotel_ids))
+    for column in OLD_COLUMNS:
+        cr.execute('ALTER TABLE migrated_hotel DROP COLUMN "%s"' % column)
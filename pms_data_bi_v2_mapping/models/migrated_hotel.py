@@ -18,17 +18,39 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 ##############################################################################
+import base64
+import gzip
+import hashlib
 import json
 import logging
+import socket
+import time
 import urllib.error
 
 import odoorpc.odoo
 
 from odoo import api, fields, models
 from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+
+from odoo.addons.queue_job.exception import RetryableJobError
 
 _logger = logging.getLogger(__name__)
 
+# Seconds to wait for the V11 nodes before giving up a request
+V2_MOP_TIMEOUT = 120
+# Connection attempts to a node, retrying its job V2_MOP_BACKOFF * attempt
+# seconds later
+V2_MOP_RETRIES = 3
+V2_MOP_BACKOFF = 10
+
+V2_MOP_ERRORS = (
+    odoorpc.error.RPCError,
+    odoorpc.error.InternalError,
+    urllib.error.URLError,
+    socket.timeout,
+)
+
 mapping_estados = {
     1: 1,
     2: 2,
@@ -45,137 +67,210 @@ class MigratedHotel(models.Model):
     _inherit = "migrated.hotel"
 
     json_to_export_reservations_v2_data = fields.Text(
-        string="Json to export", readonly=True
+        string="Json to export", compute="_compute_v2_mop_json"
+    )
+    json_to_export_outs_v2_data = fields.Text(
+        string="Json to export", compute="_compute_v2_mop_json"
+    )
+    # The payloads are kept gzipped in attachments, only read when needed
+    v2_mop_reservations_file = fields.Binary(
+        string="Reservations to export (gzip)", attachment=True, readonly=True
+    )
+    v2_mop_outs_file = fields.Binary(
+        string="Outs to export (gzip)", attachment=True, readonly=True
     )
-    json_to_export_outs_v2_data = fields.Text(string="Json to export", readonly=True)
+    v2_mop_hash = fields.Char(string="V2 MOP payload hash", readonly=True)
+    v2_mop_hash_sent = fields.Char(string="V2 MOP hash sent", readonly=True)
     log_error = fields.Text(string="Log error", readonly=True)
     str_errors = fields.Text(string="Str error", readonly=True)
+    v2_mop_state = fields.Selection(
+        [("pending", "Pending"), ("done", "Sent"), ("failed", "Failed")],
+        string="Last V2 MOP push",
+        readonly=True,
+    )
+    v2_mop_date = fields.Datetime(string="V2 MOP push date", readonly=True)
+    v2_mop_duration = fields.Float(string="V2 MOP push time (s)", readonly=True)
+    v2_mop_latency = fields.Float(
+        string="V2 MOP node write time (s)",
+        readonly=True,
+        help="Time spent writing the mapping in the V11 node",
+    )
 
     @api.model
-    def cron_update_v2_mop_fields(self, pms_property_id=False):
+    def cron_update_v2_mop_fields(self, pms_property_id=False, parallel=False):
+        """Push the V2 MOP mapping to the V11 node of the live hotels.
+
+        With parallel each node is pushed in its own queue job (channel
+        root.v2_mop), so a slow or unreachable node does not delay the rest.
+        """
         if not pms_property_id:
             properties = self.search([]).filtered(lambda x: x.in_live)
         else:
             properties = self.search([("pms_property_id", "=", pms_property_id)])
         for migrated in properties:
-            try:
-                noderpc = odoorpc.ODOO(
-                    migrated.odoo_host, migrated.odoo_protocol, migrated.odoo_port
-                )
-                noderpc.login(
-                    migrated.odoo_db, migrated.odoo_user, migrated.odoo_password
-                )
-            except (
-                odoorpc.error.RPCError,
-                odoorpc.error.InternalError,
-                urllib.error.URLError,
-            ) as err:
-                _logger.info("Error connecting to node %s" % migrated.name)
-                _logger.error(err)
-                migrated.log_error = str(err)
-                continue
-            try:
-                migrated.export_reservations_data_mapping_v2()
+            if parallel:
+                migrated.v2_mop_state = "pending"
+                migrated.with_delay(
+                    description="V2 MOP push %s" % migrated.name
+                ).push_v2_mop_fields()
+            else:
+                migrated.push_v2_mop_fields()
+
+    def push_v2_mop_fields(self):
+        """Compute the mapping of the hotel and write it in its V11 node.
+
+        The payload is only written when it changed since the last push
+        sent. The result, time and latency of the push are kept in the hotel.
+        """
+        self.ensure_one()
+        start = time.time()
+        vals = {"v2_mop_state": "failed"}
+        try:
+            noderpc = self._v2_mop_connect()
+            self.export_reservations_data_mapping_v2(noderpc)
+            if self.v2_mop_hash == self.v2_mop_hash_sent:
+                _logger.info("V2 MOP %s unchanged, not sent", self.name)
+            else:
+                push_start = time.time()
                 company = noderpc.env["res.company"].search([])
                 if company:
                     company = noderpc.env["res.company"].browse(company[0])
                     company.write(
                         {
-                            "json_reservations_v3_data": migrated.json_to_export_reservations_v2_data,
-                            "json_outs_v3_data": migrated.json_to_export_outs_v2_data,
+                            "json_reservations_v3_data": self.json_to_export_reservations_v2_data,
+                            "json_outs_v3_data": self.json_to_export_outs_v2_data,
                         }
                     )
-                noderpc.logout()
-            except (
-                odoorpc.error.RPCError,
-                odoorpc.error.InternalError,
-                urllib.error.URLError,
-            ) as err:
-                _logger.info("Error connecting to node %s" % migrated.name)
-                _logger.error(err)
-                migrated.log_error = str(err)
-                continue
-
-    def export_reservations_data_mapping_v2(self):
+                vals["v2_mop_latency"] = time.time() - push_start
+                vals["v2_mop_hash_sent"] = self.v2_mop_hash
+            noderpc.logout()
+            vals.update({"v2_mop_state": "done", "log_error": False})
+        except V2_MOP_ERRORS + (ValidationError,) as err:
+            _logger.info("Error connecting to node %s" % self.name)
+            _logger.error(err)
+            vals["log_error"] = str(err)
+        finally:
+            # Never left pending, also when the job is retried or fails
+            vals["v2_mop_date"] = fields.Datetime.now()
+            vals["v2_mop_duration"] = time.time() - start
+            self.write(vals)
+        return "%s: %s" % (self.name, vals["v2_mop_state"])
+
+    def _v2_mop_connect(self):
+        """Log in the V11 node.
+
+        In a queue job a connection error retries the job later, with
+        backoff, until V2_MOP_RETRIES attempts, instead of waiting in the
+        worker.
+        """
+        try:
+            noderpc = odoorpc.ODOO(
+                self.odoo_host,
+                self.odoo_protocol,
+                self.odoo_port,
+                timeout=V2_MOP_TIMEOUT,
+            )
+            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
+            return noderpc
+        except V2_MOP_ERRORS as err:
+            job_uuid = self.env.context.get("job_uuid")
+            job = job_uuid and self.env["queue.job"].sudo().search(
+                [("uuid", "=", job_uuid)], limit=1
+            )
+            if not job or job.retry >= V2_MOP_RETRIES:
+                raise
+            _logger.warning(
+                "Node %s, attempt %s failed: %s", self.name, job.retry, err
+            )
+            raise RetryableJobError(
+                str(err), seconds=V2_MOP_BACKOFF * job.retry
+            ) from err
+
+    def export_reservations_data_mapping_v2(self, noderpc=False):
         """
         Mapping strcuture data V14 to V11 version
+
+        noderpc = logged V11 node to reuse. Return whether the payloads
+        changed since the last export.
         """
         self.ensure_one()
-        json_data = self.env["data_bi"].export_reservations_data(
-            [self.pms_property_id.id]
+        data_bi = self.env["data_bi"]
+        secciones = data_bi.export_rows(
+            data_bi.calc_hoteles([self.pms_property_id.id]), archivos={6, 10}
         )
-        json_reservas = json.loads(json_data)[0][0].get("Reservas")
-        mapping_categories = self.get_dict_categories()
-        total = len(json_reservas)
-        _logger.info("Total de reservas a exportar: %s", total)
+        mapping_categories = self.get_dict_categories(noderpc)
+        mappings = self._get_v2_mappings()
         i = 0
         mapping_reservas = []
         errors = []
-        for reserva_vals in json_reservas:
-            try:
-                mapping_res = {}
-                for key, value in reserva_vals.items():
-                    mapping_res[key] = value
-                reserva = self.env["pms.reservation"].browse(reserva_vals["ID_Reserva"])
-                mapping_res["ID_Reserva"] = reserva.remote_id or (reserva.id * 100000)
-                mapping_res["ID_Hotel"] = 1
-                mapping_res["ID_EstadoReserva"] = mapping_estados[
-                    reserva_vals["ID_EstadoReserva"]
-                ]
-                mapping_res["ID_Segmento"] = (
-                    mapping_categories.get(reserva_vals["ID_Segmento"]) or 1
-                )
-                mapping_res["ID_Cliente"] = self.get_mapping_partners(
-                    reserva_vals["ID_Cliente"], reserva_vals["ID_Canal"]
-                )
-                mapping_res["ID_Canal"] = self.get_mapping_channels(
-                    reserva_vals["ID_Canal"]
-                )
-                mapping_res["ID_TipoHabitacion"] = self.get_mapping_room_type(
-                    reserva_vals["ID_TipoHabitacion"]
-                )
-                mapping_res["ID_HabitacionDuerme"] = self.get_mapping_room_type(
-                    reserva_vals["ID_HabitacionDuerme"]
-                )
-                mapping_res["ID_Regimen"] = self.get_mapping_regimen(
-                    reserva_vals["ID_Regimen"]
-                )
-                mapping_res["ID_Tarifa"] = self.get_mapping_pricelists(
-                    reserva_vals["ID_Tarifa"]
-                )
-                mapping_res["ID_Pais"] = reserva_vals["ID_Pais"]
-                mapping_res["ID_Room"] = self.get_mapping_rooms(reserva_vals["ID_Room"])
-                mapping_res["ID_Folio"] = reserva.folio_id.remote_id or (
-                    reserva.folio_id.id * 100000
-                )
-                mapping_reservas.append(mapping_res)
-                i += 1
-                _logger.info("%s/%s", i, total)
-            except Exception as e:
-                errors.append({
-                    "id": mapping_res["ID_Reserva"],
-                    "error": str(e)
-                })
-                _logger.error(e)
-                continue
-        json_bloqueos = json.loads(json_data)[3][0].get("Bloqueos")
+        for chunk in split_every(1000, secciones.get("Reservas", [])):
+            reservas = self._get_v2_reservations(
+                [reserva_vals["ID_Reserva"] for reserva_vals in chunk]
+            )
+            for reserva_vals in chunk:
+                try:
+                    mapping_res = {}
+                    for key, value in reserva_vals.items():
+                        mapping_res[key] = value
+                    reserva = reservas[reserva_vals["ID_Reserva"]]
+                    mapping_res["ID_Reserva"] = reserva["remote_id"]
+                    mapping_res["ID_Hotel"] = 1
+                    mapping_res["ID_EstadoReserva"] = mapping_estados[
+                        reserva_vals["ID_EstadoReserva"]
+                    ]
+                    mapping_res["ID_Segmento"] = (
+                        mapping_categories.get(reserva_vals["ID_Segmento"]) or 1
+                    )
+                    mapping_res["ID_Cliente"] = self.get_mapping_partners(
+                        reserva_vals["ID_Cliente"], reserva_vals["ID_Canal"], mappings
+                    )
+                    mapping_res["ID_Canal"] = self.get_mapping_channels(
+                        reserva_vals["ID_Canal"], mappings
+                    )
+                    mapping_res["ID_TipoHabitacion"] = self.get_mapping_room_type(
+                        reserva_vals["ID_TipoHabitacion"], mappings
+                    )
+                    mapping_res["ID_HabitacionDuerme"] = self.get_mapping_room_type(
+                        reserva_vals["ID_HabitacionDuerme"], mappings
+                    )
+                    mapping_res["ID_Regimen"] = self.get_mapping_regimen(
+                        reserva_vals["ID_Regimen"], mappings
+                    )
+                    mapping_res["ID_Tarifa"] = self.get_mapping_pricelists(
+                        reserva_vals["ID_Tarifa"], mappings
+                    )
+                    mapping_res["ID_Pais"] = reserva_vals["ID_Pais"]
+                    mapping_res["ID_Room"] = self.get_mapping_rooms(
+                        reserva_vals["ID_Room"], mappings
+                    )
+                    mapping_res["ID_Folio"] = reserva["folio_remote_id"]
+                    mapping_reservas.append(mapping_res)
+                    i += 1
+                except Exception as e:
+                    errors.append({
+                        "id": mapping_res["ID_Reserva"],
+                        "error": str(e)
+                    })
+                    _logger.error(e)
+                    continue
+            _logger.info("Reservas exportadas: %s", i)
+        bloqueos = secciones.get("Bloqueos")
         mapping_bloqueos = []
-        if json_bloqueos:
-            total = len(json_bloqueos)
+        if bloqueos:
+            total = len(bloqueos)
             i = 0
-            for bloqueo_vals in json_bloqueos:
+            for bloqueo_vals in bloqueos:
                 try:
                     mapping_blo = {}
                     for key, value in bloqueo_vals.items():
                         mapping_blo[key] = value
                     mapping_blo["ID_Hotel"] = 1
                     mapping_blo["ID_Tipo_Habitacion"] = self.get_mapping_room_type(
-                        bloqueo_vals["ID_Tipo_Habitacion"]
+                        bloqueo_vals["ID_Tipo_Habitacion"], mappings
                     )
                     mapping_blo["ID_Motivo_bloqueo"] = 1
                     mapping_bloqueos.append(mapping_blo)
                     i += 1
-                    _logger.info("%s/%s", i, total)
                 except Exception as e:
                     errors.append({
                         "id": bloqueo_vals["ID_Bloqueo"],
@@ -183,97 +278,173 @@ class MigratedHotel(models.Model):
                     })
                     _logger.error(e)
                     continue
+            _logger.info("%s/%s", i, total)
         if errors:
             # Send mail to dario@roomdoo.com with de reservation id and error
             self.str_errors = ", ".join([str(error["id"]) + ": " + str(error["error"]) for error in errors])
 
-        self.json_to_export_reservations_v2_data = json.dumps(mapping_reservas)
-        self.json_to_export_outs_v2_data = json.dumps(mapping_bloqueos)
-
-    def get_mapping_room_type(self, room_type_id):
-        remote_id = (
-            self.env["migrated.room.type"]
-            .search(
-                [
-                    ("migrated_hotel_id", "=", self.id),
-                    ("pms_room_type_id", "=", room_type_id),
-                ]
-            )
-            .remote_id
-        )
-        if remote_id:
-            return remote_id
-        else:
-            return self.env["migrated.room.type"].search(
-                [("migrated_hotel_id", "=", self.id)], limit=1
-            ).remote_id
-
-    def get_mapping_pricelists(self, pricelist_id):
-        pricelist = self.env["migrated.pricelist"].search(
-            [
-                ("migrated_hotel_id", "=", self.id),
-                ("pms_pricelist_id", "=", pricelist_id),
-            ]
+        return self._set_v2_mop_payloads(
+            json.dumps(mapping_reservas), json.dumps(mapping_bloqueos)
         )
-        if pricelist:
-            return pricelist[0].remote_id
-        else:
-            return self.env["migrated.pricelist"].search(
-                [("migrated_hotel_id", "=", self.id)], limit=1
-            ).remote_id
-
-    def get_mapping_channels(self, channel_id):
-        channel = self.env["migrated.channel.type"].search(
-            [
-                ("migrated_hotel_id", "=", self.id),
-                ("channel_type_id", "=", channel_id),
-            ]
+
+    def _set_v2_mop_payloads(self, reservas, bloqueos):
+        """Keep the payloads gzipped, unless their hash did not change.
+
+        Return whether they changed.
+        """
+        digest = hashlib.sha256(reservas.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(bloqueos.encode("utf-8"))
+        if digest.hexdigest() == self.v2_mop_hash:
+            return False
+        self.write(
+            {
+                "v2_mop_hash": digest.hexdigest(),
+                "v2_mop_reservations_file": base64.b64encode(
+                    gzip.compress(reservas.encode("utf-8"))
+                ),
+                "v2_mop_outs_file": base64.b64encode(
+                    gzip.compress(bloqueos.encode("utf-8"))
+                ),
+            }
         )
-        if channel:
-            return channel[0].remote_name
-        else:
-            return "mail"
+        return True
 
-    def get_mapping_partners(self, partner_id, channel_id):
-        if partner_id and partner_id != channel_id:
-            agency = self.env["res.partner"].search(
-                [("id", "=", partner_id), ("is_agency", "=", True)]
+    @api.depends("v2_mop_reservations_file", "v2_mop_outs_file")
+    def _compute_v2_mop_json(self):
+        for record in self:
+            record.json_to_export_reservations_v2_data = record._v2_mop_unzip(
+                record.v2_mop_reservations_file
+            )
+            record.json_to_export_outs_v2_data = record._v2_mop_unzip(
+                record.v2_mop_outs_file
             )
-            if agency:
-                return agency.data_bi_ref if agency.data_bi_ref else agency.name
-        return self.get_mapping_channels(channel_id)
 
-    def get_mapping_rooms(self, room_id):
-        room = self.env["migrated.room"].search(
-            [("migrated_hotel_id", "=", self.id), ("pms_room_id", "=", room_id)]
+    def _v2_mop_unzip(self, data):
+        if not data:
+            return False
+        return gzip.decompress(base64.b64decode(data)).decode("utf-8")
+
+    def _get_v2_mappings(self):
+        """Load at once the tables that map the V14 ids to the V11 ones.
+
+        Each table keeps the first migrated record of each V14 id, as the
+        get_mapping_* methods did with their searches.
+        """
+        self.ensure_one()
+        dominio = [("migrated_hotel_id", "=", self.id)]
+
+        def tabla(model, campo, valor):
+            resultado = {}
+            for record in self.env[model].search_read(
+                dominio, [campo, valor], order="id", load=None
+            ):
+                resultado.setdefault(record[campo], record[valor])
+            return resultado
+
+        return {
+            "room_types": tabla("migrated.room.type", "pms_room_type_id", "remote_id"),
+            "room_type_default": self.env["migrated.room.type"]
+            .search(dominio, limit=1)
+            .remote_id,
+            "pricelists": tabla("migrated.pricelist", "pms_pricelist_id", "remote_id"),
+            "pricelist_default": self.env["migrated.pricelist"]
+            .search(dominio, limit=1)
+            .remote_id,
+            "channels": tabla(
+                "migrated.channel.type", "channel_type_id", "remote_name"
+            ),
+            "rooms": tabla("migrated.room", "pms_room_id", "remote_id"),
+            "room_default": self.env["migrated.room"]
+            .search(dominio, limit=1)
+            .remote_id,
+            "boards": tabla(
+                "migrated.board.service", "board_service_id", "remote_id"
+            ),
+            "board_room_types": {
+                record["id"]: record["pms_board_service_id"]
+                for record in self.env["pms.board.service.room.type"]
+                .with_context(active_test=False)
+                .search_read([], ["pms_board_service_id"], load=None)
+            },
+            "agencies": {
+                record["id"]: record["data_bi_ref"] or record["name"]
+                for record in self.env["res.partner"].search_read(
+                    [("is_agency", "=", True)], ["data_bi_ref", "name"]
+                )
+            },
+        }
+
+    def _get_v2_reservations(self, reservation_ids):
+        """Return the V11 ids of the reservations and their folios,
+        {reservation id: {"remote_id", "folio_remote_id"}}."""
+        reservas = (
+            self.env["pms.reservation"]
+            .browse(set(reservation_ids))
+            .read(["remote_id", "folio_id"], load=None)
         )
-        if room:
-            return room[0].remote_id
-        else:
-            return self.env["migrated.room"].search(
-                [("migrated_hotel_id", "=", self.id)], limit=1
-            ).remote_id
-
-    def get_mapping_regimen(self, board_service_room_type_id):
-        board_service_id = (
-            self.env["pms.board.service.room.type"]
-            .browse(board_service_room_type_id)
-            .pms_board_service_id.id
+        folio_ids = {reserva["folio_id"] for reserva in reservas if reserva["folio_id"]}
+        folios = {
+            folio["id"]: folio["remote_id"]
+            for folio in self.env["pms.folio"].browse(folio_ids).read(["remote_id"])
+        }
+        resultado = {}
+        for reserva in reservas:
+            folio_id = reserva["folio_id"] or 0
+            resultado[reserva["id"]] = {
+                "remote_id": reserva["remote_id"] or (reserva["id"] * 100000),
+                "folio_remote_id": folios.get(folio_id) or (folio_id * 100000),
+            }
+        return resultado
+
+    def get_mapping_room_type(self, room_type_id, mappings=None):
+        mappings = mappings or self._get_v2_mappings()
+        return (
+            mappings["room_types"].get(room_type_id) or mappings["room_type_default"]
         )
-        board = self.env["migrated.board.service"].search(
-            [
-                ("migrated_hotel_id", "=", self.id),
-                ("board_service_id", "=", board_service_id),
-            ]
+
+    def get_mapping_pricelists(self, pricelist_id, mappings=None):
+        mappings = mappings or self._get_v2_mappings()
+        if pricelist_id in mappings["pricelists"]:
+            return mappings["pricelists"][pricelist_id]
+        return mappings["pricelist_default"]
+
+    def get_mapping_channels(self, channel_id, mappings=None):
+        mappings = mappings or self._get_v2_mappings()
+        if channel_id in mappings["channels"]:
+            return mappings["channels"][channel_id]
+        return "mail"
+
+    def get_mapping_partners(self, partner_id, channel_id, mappings=None):
+        mappings = mappings or self._get_v2_mappings()
+        if (
+            partner_id
+            and partner_id != channel_id
+            and partner_id in mappings["agencies"]
+        ):
+            return mappings["agencies"][partner_id]
+        return self.get_mapping_channels(channel_id, mappings)
+
+    def get_mapping_rooms(self, room_id, mappings=None):
+        mappings = mappings or self._get_v2_mappings()
+        if room_id in mappings["rooms"]:
+            return mappings["rooms"][room_id]
+        return mappings["room_default"]
+
+    def get_mapping_regimen(self, board_service_room_type_id, mappings=None):
+        mappings = mappings or self._get_v2_mappings()
+        board_service_id = mappings["board_room_types"].get(
+            board_service_room_type_id, False
         )
-        if board:
-            return board[0].remote_id
-        return False
+        return mappings["boards"].get(board_service_id, False)
 
-    def get_dict_categories(self):
+    def get_dict_categories(self, noderpc=False):
         try:
-            noderpc = odoorpc.ODOO(self.odoo_host, self.odoo_protocol, self.odoo_port)
-            noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
+            if not noderpc:
+                noderpc = odoorpc.ODOO(
+                    self.odoo_host, self.odoo_protocol, self.odoo_port
+                )
+                noderpc.login(self.odoo_db, self.odoo_user, self.odoo_password)
         except (
             odoorpc.error.RPCError,
             odoorpc.error.InternalError,